@@ -14,3 +14,7 @@ from .util import (
 from .nft import (
     XRPLNFT
 )
+from .history import (
+    export_account_txs,
+    parse_tx_row,
+)
@@ -1,5 +1,7 @@
 from . import util
+from . import history
 import json
+from pathlib import Path
 from xrpl.wallet import generate_faucet_wallet
 from xrpl.core import addresscodec
 from xrpl.models.requests.account_info import AccountInfo
@@ -11,6 +13,7 @@ from xrpl.models.requests import AccountTx
 from xrpl.asyncio.clients import AsyncWebsocketClient
 from xrpl.asyncio.transaction import get_transaction_from_hash
 from xrpl.wallet import Wallet
+from typing import AsyncIterator, Dict
 
 def create_altnet_faucet():
     """Create faucet using altnet client"""
@@ -65,7 +68,7 @@ class XRPLAccount:
                 AccountNFTs(
                     account=self.address,
                     limit=limit,
-                    #marker=marker
+                    marker=marker
                 )
             )
             if debug:
@@ -73,6 +76,26 @@ class XRPLAccount:
                 print(json.dumps(self.get_nfts_response.result, indent=4, sort_keys=True))
             return self.get_nfts_response
 
+    async def iter_nfts(self, limit: int = 400) -> AsyncIterator[Dict]:
+        """Yield every NFT held by the account, following markers on one connection"""
+        marker = None
+        async with AsyncWebsocketClient(self.network_url) as client:
+            while True:
+                response = await client.request(
+                    AccountNFTs(
+                        account=self.address,
+                        limit=limit,
+                        marker=marker
+                    )
+                )
+                if not response.is_successful():
+                    raise RuntimeError(f"account_nfts failed: {response.result}")
+                for token in response.result["account_nfts"]:
+                    yield token
+                marker = response.result.get("marker")
+                if marker is None:
+                    break
+
     async def get_offers(self, limit: int = 100, marker: str = None, debug: bool = False):
         async with AsyncWebsocketClient(self.network_url) as client:
             self.get_offers_response = await client.request(
@@ -87,13 +110,24 @@ class XRPLAccount:
                 print(json.dumps(self.get_offers_response.result, indent=4, sort_keys=True))
             return self.get_offers_response
 
-    async def get_txs(self, limit: int = 100, marker: str = None, debug: bool = False):
+    async def get_txs(
+        self,
+        limit: int = 100,
+        marker: str = None,
+        ledger_index_min: int = None,
+        ledger_index_max: int = None,
+        forward: bool = False,
+        debug: bool = False,
+    ):
         async with AsyncWebsocketClient(self.network_url) as client:
             self.get_txs_response = await client.request(
                 AccountTx(
                     account=self.address,
                     limit=limit,
-                    marker=marker
+                    marker=marker,
+                    ledger_index_min=ledger_index_min,
+                    ledger_index_max=ledger_index_max,
+                    forward=forward,
                 )
             )
             if debug:
@@ -101,6 +135,23 @@ class XRPLAccount:
                 print(json.dumps(self.get_txs_response.result, indent=4, sort_keys=True))
             return self.get_txs_response
 
+    async def export_txs(
+        self,
+        output: Path,
+        ledger_index_min: int = None,
+        ledger_index_max: int = None,
+        limit: int = 200,
+    ) -> int:
+        """Append this account's transaction history to an NDJSON file"""
+        return await history.export_account_txs(
+            self.network_url,
+            self.address,
+            output,
+            ledger_index_min=ledger_index_min,
+            ledger_index_max=ledger_index_max,
+            limit=limit,
+        )
+
     def parse_get_nfts_response(self) -> None:
        response = self.get_nfts_response.result
        for token in response["account_nfts"]:
@@ -0,0 +1,160 @@
+import json
+from pathlib import Path
+from xrpl.models.requests import AccountTx
+from xrpl.asyncio.clients import AsyncWebsocketClient
+from typing import AsyncIterator, Dict, Set, Tuple
+from .nft import get_minted_token_id
+
+TX_COLUMNS = ("ledger", "hash", "tx_type", "fee", "result", "nftoken_id", "amount")
+_TAIL_BLOCK = 64 * 1024
+
+def get_tx_token_id(tx: Dict, meta: Dict) -> str:
+    """Find the NFTokenID a transaction acted on, if any"""
+    if "NFTokenID" in tx:
+        return tx["NFTokenID"]
+    if not isinstance(meta, dict):
+        return ""
+    if "nftoken_id" in meta:
+        return meta["nftoken_id"]
+    if tx.get("TransactionType") == "NFTokenMint":
+        return get_minted_token_id(meta)
+    for node in meta.get("AffectedNodes", []):
+        offer = node.get("DeletedNode") or node.get("CreatedNode") or {}
+        if offer.get("LedgerEntryType") == "NFTokenOffer":
+            fields = offer.get("FinalFields") or offer.get("NewFields") or {}
+            if "NFTokenID" in fields:
+                return fields["NFTokenID"]
+    return ""
+
+def parse_tx_row(entry: Dict) -> Dict:
+    """Flatten an account_tx entry into one export row"""
+    tx = entry["tx"]
+    meta = entry.get("meta", {})
+    amount = None
+    if isinstance(meta, dict):
+        amount = meta.get("delivered_amount")
+    if amount is None:
+        amount = tx.get("Amount")
+    return {
+        "ledger": tx.get("ledger_index", entry.get("ledger_index")),
+        "hash": tx.get("hash"),
+        "tx_type": tx.get("TransactionType"),
+        "fee": tx.get("Fee"),
+        "result": meta.get("TransactionResult") if isinstance(meta, dict) else None,
+        "nftoken_id": get_tx_token_id(tx, meta),
+        "amount": amount,
+    }
+
+def read_export_state(output: Path) -> Tuple[int, Set[str]]:
+    """Last exported ledger and the hashes already written for it.
+
+    Only the tail of the file is read, so resuming costs the same no matter
+    how much history has been exported before.
+    """
+    if not output.exists():
+        return (None, set())
+    last_ledger = None
+    hashes = set()
+    with output.open("rb") as f:
+        f.seek(0, 2)
+        pos = f.tell()
+        pending = b""
+        while pos > 0:
+            step = min(_TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + pending).split(b"\n")
+            # first piece may be a partial line unless we are at the start
+            pending = lines.pop(0) if pos > 0 else b""
+            for line in reversed(lines):
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if last_ledger is None:
+                    last_ledger = row["ledger"]
+                if row["ledger"] != last_ledger:
+                    return (last_ledger, hashes)
+                hashes.add(row["hash"])
+    return (last_ledger, hashes)
+
+def trim_partial_line(output: Path) -> None:
+    """Drop a trailing line left half-written by an interrupted export"""
+    if not output.exists():
+        return None
+    with output.open("rb+") as f:
+        f.seek(0, 2)
+        size = f.tell()
+        pos = size
+        while pos > 0:
+            step = min(_TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                if pos + newline + 1 != size:
+                    f.truncate(pos + newline + 1)
+                return None
+        f.truncate(0)
+
+async def iter_account_txs(
+    network_url: str,
+    account: str,
+    ledger_index_min: int = -1,
+    ledger_index_max: int = -1,
+    limit: int = 200,
+) -> AsyncIterator[Dict]:
+    """Yield validated account_tx entries oldest first, following markers"""
+    marker = None
+    async with AsyncWebsocketClient(network_url) as client:
+        while True:
+            response = await client.request(
+                AccountTx(
+                    account=account,
+                    ledger_index_min=ledger_index_min,
+                    ledger_index_max=ledger_index_max,
+                    forward=True,
+                    limit=limit,
+                    marker=marker,
+                )
+            )
+            if not response.is_successful():
+                raise RuntimeError(f"account_tx failed: {response.result}")
+            for entry in response.result["transactions"]:
+                if entry.get("validated", True):
+                    yield entry
+            marker = response.result.get("marker")
+            if marker is None:
+                break
+
+async def export_account_txs(
+    network_url: str,
+    account: str,
+    output: Path,
+    ledger_index_min: int = None,
+    ledger_index_max: int = None,
+    limit: int = 200,
+) -> int:
+    """Append an account's transaction history to an NDJSON file.
+
+    Each line holds the TX_COLUMNS of one transaction, oldest first. On
+    re-runs the export picks up from the last ledger already in the file,
+    so only new history is fetched and nothing is written twice.
+    """
+    trim_partial_line(output)
+    last_ledger, seen = read_export_state(output)
+    start = -1 if ledger_index_min is None else ledger_index_min
+    if last_ledger is not None:
+        start = max(start, last_ledger)
+    end = -1 if ledger_index_max is None else ledger_index_max
+    written = 0
+    with output.open("a", encoding="utf-8") as f:
+        async for entry in iter_account_txs(network_url, account, start, end, limit):
+            row = parse_tx_row(entry)
+            if row["ledger"] == last_ledger and row["hash"] in seen:
+                continue
+            f.write(json.dumps(row, separators=(",", ":")) + "\n")
+            written += 1
+            if written % limit == 0:
+                f.flush()
+    return written
@@ -54,7 +54,7 @@ class XRPLNFT:
     ) -> None:
         self.mint_tx = NFTokenMint(
                 account=self.issuer,
-                token_taxon=taxon,
+                nftoken_taxon=taxon,
                 uri=self.uri,
                 flags=flags,
                 transfer_fee=transfer_fee,
@@ -112,17 +112,26 @@ class XRPLNFT:
         )
         self.offer_tx_ready = True
 
+    async def sign_mint_tx(self, wallet: Wallet, client: AsyncWebsocketClient) -> str:
+        signed_tx = await safe_sign_and_autofill_transaction(self.mint_tx, wallet, client)
+        self.signed_mint_tx = signed_tx
+        self.sequence = signed_tx.sequence
+        self.max_ledger = signed_tx.last_ledger_sequence
+        self.tx_id = signed_tx.get_hash()
+        self.fee_in_xrp = drops_to_xrp(signed_tx.fee)
+        return self.tx_id
+
+    async def submit_mint_tx(self, client: AsyncWebsocketClient) -> ResponseStatus:
+        self.mint_response = await send_reliable_submission(self.signed_mint_tx, client)
+        if self.mint_response.status == ResponseStatus.SUCCESS:
+            self.minted = True
+        return self.mint_response.status
+
     async def mint(self, wallet: Wallet) -> ResponseStatus:
         async with AsyncWebsocketClient(self.network_url) as client:
             if self.mint_ready:
-                signed_tx = await safe_sign_and_autofill_transaction(self.mint_tx, wallet, client)
-                self.max_ledger = signed_tx.last_ledger_sequence
-                self.tx_id = signed_tx.get_hash()
-                self.fee_in_xrp = drops_to_xrp(signed_tx.fee)
-                self.mint_response = await send_reliable_submission(signed_tx, client)
-                if self.mint_response.status == ResponseStatus.SUCCESS:
-                    self.minted = True
-                return self.mint_response.status
+                await self.sign_mint_tx(wallet, client)
+                return await self.submit_mint_tx(client)
 
     async def create_sell_offer(self, wallet: Wallet) -> ResponseStatus:
         async with AsyncWebsocketClient(self.network_url) as client:
@@ -197,26 +206,23 @@ class XRPLNFT:
         tx_data = self.mint_response.result
         if "meta" not in tx_data:
             return ""
-        self.tokenID = ""
-        nft_node = None
-        for node in tx_data["meta"]["AffectedNodes"]:
-            if "CreatedNode" in node:
-                if "NFTokens" in node["CreatedNode"]["NewFields"]:
-                    nft_node = node
-                    break
-            elif "ModifiedNode" in node:
-                if "NFTokens" in node["ModifiedNode"]["FinalFields"]:
-                    nft_node = node
-                    break
+        self.tokenID = get_minted_token_id(tx_data["meta"])
+        return self.tokenID
+
+def get_minted_token_id(meta: Dict) -> str:
+    """Find the NFTokenID created by a mint from its transaction metadata"""
+    for node in meta["AffectedNodes"]:
         if "CreatedNode" in node:
-            self.tokenID = node["CreatedNode"]["NewFields"]["NFTokens"][0]["NFToken"]["NFTokenID"]
+            if "NFTokens" in node["CreatedNode"]["NewFields"]:
+                return node["CreatedNode"]["NewFields"]["NFTokens"][0]["NFToken"]["NFTokenID"]
         elif "ModifiedNode" in node:
-            new_tokens = set()
-            old_tokens = set()
-            for entry in node["ModifiedNode"]["FinalFields"]["NFTokens"]:
-                new_tokens.add(entry["NFToken"]["NFTokenID"])
-            for entry in node["ModifiedNode"]["PreviousFields"]["NFTokens"]:
-                old_tokens.add(entry["NFToken"]["NFTokenID"])
-            new_tokenID = new_tokens - old_tokens
-            self.tokenID = new_tokenID.pop()
-        return self.tokenID
+            if "NFTokens" in node["ModifiedNode"].get("PreviousFields", {}):
+                new_tokens = set()
+                old_tokens = set()
+                for entry in node["ModifiedNode"]["FinalFields"]["NFTokens"]:
+                    new_tokens.add(entry["NFToken"]["NFTokenID"])
+                for entry in node["ModifiedNode"]["PreviousFields"]["NFTokens"]:
+                    old_tokens.add(entry["NFToken"]["NFTokenID"])
+                new_tokenID = new_tokens - old_tokens
+                return new_tokenID.pop()
+    return ""
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+from context import (
+    XRPLNFT,
+)
+import gc
+import sys
+import json
+import time
+import timeit
+import platform
+import tempfile
+import tracemalloc
+import statistics
+import click
+from pathlib import Path
+from typing import Callable, Dict, List
+from xrpl.constants import CryptoAlgorithm
+from xrpl.core.keypairs import generate_seed
+from xrpl.models.response import Response, ResponseStatus
+from xrpl.models.transactions import NFTokenMint, NFTokenMintFlag
+from xrpl.transaction import safe_sign_transaction
+from xrpl.utils import hex_to_str, str_to_hex
+from xrpl.wallet import Wallet
+from mint_nft import encode_taxon, decode_taxon
+from records import RecordWriter, RecordFile
+from utils import update_json_with_url
+
+DEFAULT_BASELINE_FILE = Path(__file__).parent / "baselines.json"
+# fixed entropy so every run signs with the same key
+_SEED = generate_seed(entropy="00" * 16, algorithm=CryptoAlgorithm.SECP256K1)
+_ISSUER = Wallet(_SEED, 0).classic_address
+_URI = "ipfs://bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi/collection{}.json"
+_COLLECTION_ID = 7
+_PAGE_SIZE = 32
+_RECORDS = 1000
+
+def nftoken_id(index: int) -> str:
+    return f"00080000{index:056X}"
+
+def synthetic_metadata(index: int) -> Dict:
+    return {
+        "name": f"collection{index}.json",
+        "description": "benchmark token",
+        "image": _URI.format(index).replace(".json", ".png"),
+        "edition": index,
+        "attributes": [
+            {"trait_type": trait, "value": f"{trait}-{index % 7}"}
+            for trait in ("background", "pet", "pot", "eyes", "neck", "head", "mask", "clothes")
+        ],
+        "tokenID": nftoken_id(index),
+        "uri": _URI.format(index),
+    }
+
+def full_page_meta() -> Dict:
+    """Mint metadata that adds the 32nd token to an NFTokenPage"""
+    tokens = [
+        {"NFToken": {"NFTokenID": nftoken_id(i), "URI": str_to_hex(_URI.format(i))}}
+        for i in range(_PAGE_SIZE)
+    ]
+    return {
+        "AffectedNodes": [
+            {"ModifiedNode": {
+                "LedgerEntryType": "AccountRoot",
+                "FinalFields": {"Account": _ISSUER, "MintedNFTokens": _PAGE_SIZE},
+                "PreviousFields": {"MintedNFTokens": _PAGE_SIZE - 1},
+            }},
+            {"ModifiedNode": {
+                "LedgerEntryType": "NFTokenPage",
+                "FinalFields": {"NFTokens": tokens},
+                "PreviousFields": {"NFTokens": tokens[:-1]},
+            }},
+        ],
+        "TransactionResult": "tesSUCCESS",
+    }
+
+def bench_encode_taxon() -> Callable:
+    return lambda: encode_taxon(123456, _COLLECTION_ID)
+
+def bench_decode_taxon() -> Callable:
+    packed = encode_taxon(123456, _COLLECTION_ID) & 0xFFFFFFFF
+    return lambda: decode_taxon(packed)
+
+def bench_get_token_id() -> Callable:
+    nft = XRPLNFT(issuer=_ISSUER, uri=_URI.format(0), network_url="")
+    nft.minted = True
+    nft.mint_response = Response(status=ResponseStatus.SUCCESS, result={"meta": full_page_meta()})
+    return nft.get_token_id
+
+def bench_prepare_mint_tx() -> Callable:
+    taxon = encode_taxon(123456, _COLLECTION_ID)
+    flags = [NFTokenMintFlag.TF_TRANSFERABLE, NFTokenMintFlag.TF_ONLY_XRP]
+    def run() -> None:
+        nft = XRPLNFT(issuer=_ISSUER, uri=_URI.format(123456), network_url="")
+        nft.prepare_mint_tx(taxon=taxon, flags=flags, transfer_fee=1000)
+    return run
+
+def bench_sign_mint_tx() -> Callable:
+    """Sign a prepared mint with the fields autofill would add, without a client"""
+    wallet = Wallet(_SEED, 1)
+    nft = XRPLNFT(issuer=wallet.classic_address, uri=_URI.format(123456), network_url="")
+    nft.prepare_mint_tx(
+        taxon=encode_taxon(123456, _COLLECTION_ID),
+        flags=[NFTokenMintFlag.TF_TRANSFERABLE, NFTokenMintFlag.TF_ONLY_XRP],
+        transfer_fee=1000,
+    )
+    tx = NFTokenMint.from_dict(dict(
+        nft.mint_tx.to_dict(),
+        sequence=1,
+        fee="12",
+        last_ledger_sequence=100,
+    ))
+    return lambda: safe_sign_transaction(tx, wallet, check_fee=False)
+
+def bench_uri_check_page() -> Callable:
+    """Decode and compare the URIs of one account_nfts page, as --get_mints does"""
+    page = [(str_to_hex(_URI.format(i)).upper(), _URI.format(i)) for i in range(_PAGE_SIZE)]
+    return lambda: [hex_to_str(uri) == expected for uri, expected in page]
+
+def bench_update_json_with_url(workdir: Path) -> Callable:
+    path = workdir / "collection1.json"
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(synthetic_metadata(1), f, ensure_ascii=False, indent=4)
+    return lambda: update_json_with_url(path, _URI.format(1).replace(".json", ".png"))
+
+def bench_records_json_dump(workdir: Path) -> Callable:
+    records = {str(i): synthetic_metadata(i) for i in range(_RECORDS)}
+    path = workdir / "minted.json"
+    def run() -> None:
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=4)
+    return run
+
+def bench_records_json_load(workdir: Path) -> Callable:
+    path = workdir / "minted-load.json"
+    with path.open("w", encoding="utf-8") as f:
+        json.dump({str(i): synthetic_metadata(i) for i in range(_RECORDS)}, f, ensure_ascii=False, indent=4)
+    def run() -> Dict:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    return run
+
+def bench_records_ndjson_write(workdir: Path) -> Callable:
+    records = [(i, synthetic_metadata(i)) for i in range(_RECORDS)]
+    path = workdir / "minted.ndjson"
+    def run() -> None:
+        for stale in (path, path.with_name(path.name + ".idx")):
+            if stale.exists():
+                stale.unlink()
+        with RecordWriter(path) as writer:
+            for index, record in records:
+                writer.write(index, record)
+    return run
+
+def bench_records_ndjson_read(workdir: Path) -> Callable:
+    path = workdir / "minted-read.ndjson"
+    with RecordWriter(path) as writer:
+        for i in range(_RECORDS):
+            writer.write(i, synthetic_metadata(i))
+    def run() -> int:
+        with RecordFile(path) as records:
+            return sum(1 for _ in records.items())
+    return run
+
+BENCHMARKS = {
+    "taxon.encode": bench_encode_taxon,
+    "taxon.decode": bench_decode_taxon,
+    "nft.get_token_id": bench_get_token_id,
+    "nft.prepare_mint_tx": bench_prepare_mint_tx,
+    "nft.sign_mint_tx": bench_sign_mint_tx,
+    "uri.check_page": bench_uri_check_page,
+    "json.update_with_url": bench_update_json_with_url,
+    "records.json_dump": bench_records_json_dump,
+    "records.json_load": bench_records_json_load,
+    "records.ndjson_write": bench_records_ndjson_write,
+    "records.ndjson_read": bench_records_ndjson_read,
+}
+NEEDS_WORKDIR = {
+    "json.update_with_url",
+    "records.json_dump",
+    "records.json_load",
+    "records.ndjson_write",
+    "records.ndjson_read",
+}
+
+def measure(func: Callable, repeat: int) -> Dict[str, float]:
+    """Median seconds per call over repeat runs, and peak bytes allocated by one call.
+
+    Each run loops for at least 0.2s, calibrated by timeit's autorange, with
+    the garbage collector off while timing. The median keeps one slow or
+    lucky run from moving the result.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    median = statistics.median(timer.repeat(repeat=repeat, number=number)) / number
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": median, "peak_bytes": peak, "loops": number}
+
+def compare(results: Dict[str, Dict], baselines: Dict[str, Dict], threshold: float) -> List[str]:
+    """Names of benchmarks slower, or peaking higher, than baseline by more than threshold"""
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        for key in ("seconds", "peak_bytes"):
+            if baseline[key] and result[key] > baseline[key] * (1 + threshold):
+                regressions.append(name)
+                break
+    return regressions
+
+def load_baselines(baseline_file: Path) -> Dict[str, Dict]:
+    if not baseline_file.exists():
+        return {}
+    with baseline_file.open("r", encoding="utf-8") as f:
+        return json.load(f)["benchmarks"]
+
+def save_baselines(baseline_file: Path, results: Dict[str, Dict]) -> None:
+    with baseline_file.open("w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "saved": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "benchmarks": results,
+            },
+            f,
+            indent=4,
+            sort_keys=True,
+        )
+
+def _format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+@click.command(help="Time and measure the memory of the library's hot paths against stored baselines")
+@click.option(
+    '-b',
+    '--baseline_file',
+    default=DEFAULT_BASELINE_FILE,
+    type=Path,
+    help='Baselines to compare against, written on the first run or with --save'
+)
+@click.option(
+    '-k',
+    '--select',
+    default="",
+    type=click.STRING,
+    help='Only run benchmarks whose name contains this string'
+)
+@click.option(
+    '-r',
+    '--repeat',
+    default=7,
+    type=click.INT,
+    help='Timing runs per benchmark, the median is reported'
+)
+@click.option(
+    '-t',
+    '--threshold',
+    default=0.5,
+    type=click.FLOAT,
+    help='Fraction over baseline time or peak memory reported as a regression'
+)
+@click.option(
+    '-s',
+    '--save',
+    is_flag=True,
+    help='Overwrite the baselines of the benchmarks run with these results'
+)
+def bench(baseline_file, select, repeat, threshold, save) -> None:
+    baselines = load_baselines(baseline_file)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, setup in BENCHMARKS.items():
+            if select not in name:
+                continue
+            func = setup(Path(workdir)) if name in NEEDS_WORKDIR else setup()
+            results[name] = measure(func, repeat)
+            result = results[name]
+            line = f"{name:<24} {_format_seconds(result['seconds']):>10} {result['peak_bytes']:>10} B peak"
+            if name in baselines:
+                line += f"  {result['seconds'] / baselines[name]['seconds']:.2f}x time"
+                if baselines[name]["peak_bytes"]:
+                    line += f" {result['peak_bytes'] / baselines[name]['peak_bytes']:.2f}x mem"
+            print(line)
+    regressions = compare(results, baselines, threshold)
+    if save or not baselines:
+        save_baselines(baseline_file, dict(baselines, **results))
+        print(f"SAVED {len(results)} baselines => {baseline_file}")
+    if regressions:
+        print(f"REGRESSION over {threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    bench()
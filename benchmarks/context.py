@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), '../tools/minter')))
+
+from aqrl_xrpl import (
+    XRPLAccount,
+    XRPLNFT,
+    get_network_url,
+)
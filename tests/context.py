@@ -3,5 +3,13 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), '../tools/minter')))
 
 import aqrl_xrpl
+import cid
+import ipfs
+import journal
+import mint_nft
+import pin_index
+import records
+import utils
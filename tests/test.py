@@ -1,8 +1,22 @@
 # -*- coding: utf-8 -*-
 
-from .context import aqrl_xrpl
+from .context import aqrl_xrpl, cid, ipfs, journal, mint_nft, pin_index, records, utils
 from xrpl.clients import JsonRpcClient
+from xrpl.asyncio.clients.exceptions import XRPLRequestFailureException
+from xrpl.asyncio.transaction import XRPLReliableSubmissionException
+from xrpl.models.response import Response, ResponseStatus
+from pathlib import Path
+from unittest import mock
+from logging.handlers import QueueListener
 
+import asyncio
+import io
+import httpx
+import json
+import logging
+import queue
+import sys
+import tempfile
 import unittest
 
 class AQRLTestSuite(unittest.TestCase):
@@ -25,5 +39,566 @@ class AQRLTestSuite(unittest.TestCase):
         account = aqrl_xrpl.create_account(wallet)
         self.assertTrue(aqrl_xrpl.lookup_account_info(account))
 
+    def test_parse_tx_row(self):
+        entry = {
+            "tx": {
+                "TransactionType": "NFTokenCreateOffer",
+                "hash": "ABCD",
+                "ledger_index": 42,
+                "Fee": "12",
+                "Amount": "1000000",
+                "NFTokenID": "000800",
+            },
+            "meta": {"TransactionResult": "tesSUCCESS", "AffectedNodes": []},
+            "validated": True,
+        }
+        row = aqrl_xrpl.parse_tx_row(entry)
+        self.assertEqual(row["ledger"], 42)
+        self.assertEqual(row["nftoken_id"], "000800")
+        self.assertEqual(row["result"], "tesSUCCESS")
+        self.assertEqual(row["amount"], "1000000")
+
+class MintJournalTestSuite(unittest.TestCase):
+    """Journal replay and resume state."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "mint-journal.log"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_replay_latest_state(self):
+        j = journal.MintJournal(self.path, 7)
+        j.record(journal.PREPARED, 1, taxon=mint_nft.encode_taxon(1, 7))
+        j.record(journal.SIGNED, 1, sequence=10, tx_hash="H1", last_ledger=100)
+        j.record(journal.SUBMITTED, 1)
+        j.record(journal.VALIDATED, 1, result="tesSUCCESS")
+        j.record(journal.PREPARED, 2, taxon=mint_nft.encode_taxon(2, 7))
+        j.record(journal.SIGNED, 2, sequence=11, tx_hash="H2", last_ledger=101)
+        j.close()
+        replayed = journal.MintJournal(self.path, 7)
+        self.assertTrue(replayed.is_minted(1))
+        self.assertFalse(replayed.is_minted(2))
+        self.assertEqual([(e["index"], e["hash"], e["last_ledger"]) for e in replayed.in_flight()], [(2, "H2", 101)])
+        replayed.close()
+
+    def test_prepared_drops_previous_attempt(self):
+        j = journal.MintJournal(self.path, 7)
+        j.record(journal.SIGNED, 3, tx_hash="OLD", last_ledger=5)
+        j.record(journal.PREPARED, 3, taxon=mint_nft.encode_taxon(3, 7))
+        self.assertIsNone(j.entries[3]["hash"])
+        self.assertEqual(j.in_flight(), [])
+        j.close()
+
+    def test_torn_line_ignored(self):
+        j = journal.MintJournal(self.path, 7)
+        j.record(journal.PREPARED, 4, taxon=mint_nft.encode_taxon(4, 7))
+        j.record(journal.SIGNED, 4, tx_hash="H4", last_ledger=9)
+        j.close()
+        with self.path.open("ab") as f:
+            f.write(b'["V",4,nu')
+        replayed = journal.MintJournal(self.path, 7)
+        self.assertEqual(replayed.entries[4]["state"], journal.SIGNED)
+        replayed.record(journal.VALIDATED, 4, result="tesSUCCESS")
+        replayed.close()
+        self.assertTrue(journal.MintJournal(self.path, 7).is_minted(4))
+
+    def test_collections_share_file(self):
+        first = journal.MintJournal(self.path, 7)
+        first.record(journal.PREPARED, 5, taxon=mint_nft.encode_taxon(5, 7))
+        first.record(journal.VALIDATED, 5, result="tesSUCCESS")
+        first.close()
+        second = journal.MintJournal(self.path, 8)
+        self.assertFalse(second.is_minted(5))
+        second.close()
+        self.assertTrue(journal.MintJournal(self.path, 7).is_minted(5))
+
+    def test_legacy_lines_keyed_by_taxon(self):
+        with self.path.open("w") as f:
+            f.write('["V",6,%d,1,"H6","tesSUCCESS",20]\n' % mint_nft.encode_taxon(6, -3))
+        self.assertTrue(journal.MintJournal(self.path, -3).is_minted(6))
+        self.assertFalse(journal.MintJournal(self.path, 7).is_minted(6))
+
+def tx_response(tx_result: str = "tesSUCCESS", validated: bool = True) -> Response:
+    return Response(
+        status=ResponseStatus.SUCCESS,
+        result={"validated": validated, "meta": {"TransactionResult": tx_result}},
+    )
+
+def not_found() -> XRPLRequestFailureException:
+    return XRPLRequestFailureException({"error": "txnNotFound"})
+
+class SettleInFlightTestSuite(unittest.TestCase):
+    """settle_in_flight against a stubbed ledger."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = journal.MintJournal(Path(self.tmp.name) / "mint-journal.log", 7)
+        self.journal.record(journal.PREPARED, 1, taxon=mint_nft.encode_taxon(1, 7))
+        self.journal.record(journal.SIGNED, 1, tx_hash="H1", last_ledger=100)
+        self.logger = logging.getLogger("settle-test")
+
+    def tearDown(self):
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def settle(self, tx_results, ledgers=(99,)):
+        get_tx = mock.AsyncMock(side_effect=tx_results)
+        get_ledger = mock.AsyncMock(side_effect=ledgers)
+        with mock.patch.object(mint_nft, "get_transaction_from_hash", get_tx), \
+                mock.patch.object(mint_nft, "get_latest_validated_ledger_sequence", get_ledger), \
+                mock.patch.object(mint_nft, "_LEDGER_CLOSE_TIME", 0):
+            asyncio.run(mint_nft.settle_in_flight(self.journal, object(), self.logger))
+        return get_tx, get_ledger
+
+    def test_validated(self):
+        self.settle([tx_response()])
+        self.assertTrue(self.journal.is_minted(1))
+
+    def test_failed(self):
+        self.settle([tx_response("tecNO_PERMISSION")])
+        self.assertEqual(self.journal.entries[1]["state"], journal.FAILED)
+        self.assertEqual(self.journal.entries[1]["result"], "tecNO_PERMISSION")
+
+    def test_not_found_then_expired(self):
+        get_tx, _ = self.settle([not_found(), not_found()], ledgers=[100, 101])
+        self.assertEqual(self.journal.entries[1]["state"], journal.FAILED)
+        self.assertEqual(self.journal.entries[1]["result"], "expired")
+        self.assertEqual(get_tx.await_count, 2)
+
+    def test_not_found_then_found(self):
+        self.settle([not_found(), tx_response(validated=False), tx_response()], ledgers=[98, 99])
+        self.assertTrue(self.journal.is_minted(1))
+        self.assertEqual(self.journal.in_flight(), [])
+
+    def test_other_errors_propagate(self):
+        with self.assertRaises(XRPLRequestFailureException):
+            self.settle([XRPLRequestFailureException({"error": "invalidParams"})])
+
+class CidTestSuite(unittest.TestCase):
+    """Local CIDs against the ones `ipfs add` reports."""
+
+    KNOWN = {
+        "empty": (
+            b"",
+            "QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH",
+            "bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku",
+        ),
+        "hello": (
+            b"hello world\n",
+            "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o",
+            "bafkreifjjcie6lypi6ny7amxnfftagclbuxndqonfipmb64f2km2devei4",
+        ),
+        "two-chunks": (
+            bytes(range(256)) * 2048,
+            "QmZ63CUmxwNSpqCDFL3x3EKXvbHhxdbfRLtW4Xonc53VbW",
+            "bafybeidskqir6ikiqxozidrejcofr3zho3eenlrvzlx56zysq2nqepsqhe",
+        ),
+    }
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = {}
+        for name, (data, _, _) in self.KNOWN.items():
+            path = Path(self.tmp.name) / name
+            path.write_bytes(data)
+            self.paths[name] = path
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_v0(self):
+        cids = cid.file_cids(list(self.paths.values()))
+        for name, (_, v0, _) in self.KNOWN.items():
+            self.assertEqual(cids[self.paths[name]], v0, name)
+
+    def test_v1(self):
+        cids = cid.file_cids(list(self.paths.values()), version=1)
+        for name, (_, _, v1) in self.KNOWN.items():
+            self.assertEqual(cids[self.paths[name]], v1, name)
+
+    def test_empty_directory(self):
+        self.assertEqual(cid.directory_cid([]), ("QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn", {}))
+        self.assertEqual(
+            cid.directory_cid([], version=1),
+            ("bafybeiczsscdsbs7ffqz55asqdf3smv6klcw3gofszvwlyarci47bgf354", {}),
+        )
+
+    def test_directory_entries(self):
+        paths = list(self.paths.values())
+        for version in (0, 1):
+            dir_cid, entries = cid.directory_cid(paths, version)
+            self.assertEqual(cid.directory_cid(paths[::-1], version)[0], dir_cid)
+            self.assertNotEqual(cid.directory_cid(paths[1:], version)[0], dir_cid)
+            self.assertEqual(
+                entries,
+                {path.name: value for path, value in cid.file_cids(paths, version).items()},
+            )
+
+class IterJsonObjectTestSuite(unittest.TestCase):
+    """iter_json_object with blocks small enough to cut every token."""
+
+    RECORDS = {
+        "1": {"name": "collection1.json", "tokenID": "00080000ABCD", "edition": 1},
+        "quote\"key": "a \"quoted\" value with \\ and \n",
+        "unicode": "caf\u00e9 \u2603 \U0001f600",
+        "numbers": [12345678901234567890, -0.125, 6.02e23, 0],
+        "braces": "} , : { [ ]",
+        "1000": 1234567,
+        "last": None,
+    }
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "minted.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, text):
+        self.path.write_text(text, encoding="utf-8")
+
+    def test_block_boundaries(self):
+        for dump in (
+            lambda: json.dumps(self.RECORDS, ensure_ascii=False, indent=4),
+            lambda: json.dumps(self.RECORDS, separators=(",", ":")),
+        ):
+            self.write(dump())
+            for block_size in range(1, 9):
+                self.assertEqual(
+                    list(utils.iter_json_object(self.path, block_size)),
+                    list(self.RECORDS.items()),
+                    block_size,
+                )
+
+    def test_number_cut_at_boundary(self):
+        self.write('{"a": 1234567, "b": 89}')
+        for block_size in range(1, 12):
+            self.assertEqual(list(utils.iter_json_object(self.path, block_size)), [("a", 1234567), ("b", 89)])
+
+    def test_empty_object(self):
+        self.write(" { } ")
+        self.assertEqual(list(utils.iter_json_object(self.path, 1)), [])
+
+    def test_not_an_object(self):
+        self.write('["a", 1]')
+        with self.assertRaises(ValueError):
+            list(utils.iter_json_object(self.path, 2))
+
+    def test_truncated(self):
+        self.write('{"a": 1, "b": "unterminated')
+        with self.assertRaises(ValueError):
+            list(utils.iter_json_object(self.path, 4))
+
+class RecordFileTestSuite(unittest.TestCase):
+    """RecordWriter, RecordFile and compact on a temp record file."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "minted.ndjson"
+        self.sidecar = records.index_path(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, *entries):
+        with records.RecordWriter(self.path) as writer:
+            for key, value in entries:
+                writer.write(key, value)
+
+    def read(self):
+        with records.RecordFile(self.path) as entries:
+            return dict(entries), list(entries.items())
+
+    def test_overwrite_latest_wins(self):
+        self.write((1, {"uri": "a"}), (2, {"uri": "b"}))
+        self.write((1, {"uri": "c"}))
+        latest, items = self.read()
+        self.assertEqual(latest, {"1": {"uri": "c"}, "2": {"uri": "b"}})
+        self.assertEqual(items, [("2", {"uri": "b"}), ("1", {"uri": "c"})])
+
+    def test_torn_trailing_line(self):
+        self.write((1, "a"), (2, "b"))
+        with self.path.open("ab") as f:
+            f.write(b'["3","unfinis')
+        self.assertEqual(self.read()[0], {"1": "a", "2": "b"})
+        self.write((3, "c"))
+        self.assertEqual(self.read()[0], {"1": "a", "2": "b", "3": "c"})
+        self.assertTrue(self.path.read_bytes().endswith(b'["3","c"]\n'))
+
+    def test_missing_sidecar_rebuilt(self):
+        self.write((1, "a"), (2, "b"))
+        self.sidecar.unlink()
+        self.assertEqual(self.read()[0], {"1": "a", "2": "b"})
+        self.assertEqual(len(self.sidecar.read_text().splitlines()), 2)
+
+    def test_stale_sidecar_rebuilt(self):
+        self.write((1, "a"), (2, "b"), (3, "c"))
+        # data file rolled back to two records, sidecar still lists three
+        with self.path.open("rb") as f:
+            lines = f.readlines()
+        self.path.write_bytes(b"".join(lines[:2]))
+        self.assertEqual(self.read()[0], {"1": "a", "2": "b"})
+        self.sidecar.write_text("not json\n")
+        self.assertEqual(self.read()[0], {"1": "a", "2": "b"})
+
+    def test_sidecar_behind(self):
+        self.write((1, "a"))
+        with self.path.open("ab") as f:
+            f.write(b'["2","b"]\n')
+        self.assertEqual(self.read()[0], {"1": "a", "2": "b"})
+
+    def test_compact(self):
+        self.write((10, "x"), (2, "y"), (10, "z"), ("name", "n"))
+        before, after = records.compact(self.path)
+        self.assertLess(after, before)
+        self.assertEqual(self.read()[1], [("2", "y"), ("10", "z"), ("name", "n")])
+        self.assertEqual(
+            [json.loads(line)[0] for line in self.sidecar.read_text().splitlines()],
+            ["2", "10", "name"],
+        )
+
+def pin_row(name: str, cid: str, date_pinned: str) -> dict:
+    return {"ipfs_pin_hash": cid, "date_pinned": date_pinned, "size": 1, "metadata": {"name": name}}
+
+class AsyncIPFSRepoTestSuite(unittest.TestCase):
+    """AsyncIPFSRepo against a mocked Pinata API."""
+
+    ROWS = [
+        pin_row("coll1.json", "QmOld", "2022-01-01T00:00:00.000Z"),
+        pin_row("coll2.json", "QmTwo", "2022-01-02T00:00:00.000Z"),
+        pin_row("coll1.json", "QmNew", "2022-01-03T00:00:00.000Z"),
+        pin_row("other1.json", "QmOther", "2022-01-04T00:00:00.000Z"),
+        pin_row("coll3.json", "QmThree", "2022-01-05T00:00:00.000Z"),
+    ]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.auth_cache = Path(self.tmp.name) / "ipfs-auth.json"
+        self.requests = []
+        self.auth_ok = True
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def handler(self, request):
+        self.requests.append(request)
+        if request.url.path == "/data/testAuthentication":
+            message = ipfs.PINATA_AUTH_RESPONSE if self.auth_ok else "Invalid API key"
+            return httpx.Response(200, json={"message": message})
+        if request.url.path == "/pinning/pinFileToIPFS":
+            return httpx.Response(200, json={"IpfsHash": "QmPinned", "PinSize": len(request.content)})
+        if request.url.path == "/data/pinList":
+            offset = int(request.url.params["pageOffset"])
+            limit = int(request.url.params["pageLimit"])
+            return httpx.Response(200, json={"rows": self.ROWS[offset:offset + limit]})
+        return httpx.Response(404)
+
+    def repo(self):
+        return ipfs.AsyncIPFSRepo(
+            "key",
+            "secret",
+            auth_cache=self.auth_cache,
+            transport=httpx.MockTransport(self.handler),
+        )
+
+    def paths(self, path):
+        return [request.url.path for request in self.requests if request.url.path == path]
+
+    async def pin_twice(self, filepath):
+        async with self.repo() as repo:
+            return [await repo.pin(filepath), await repo.pin(filepath)]
+
+    def test_pin_streams_file_and_auths_once(self):
+        filepath = Path(self.tmp.name) / "coll1.png"
+        data = bytes(range(256)) * (ipfs.STREAM_BLOCK_SIZE // 128 + 3)
+        filepath.write_bytes(data)
+        responses = asyncio.run(self.pin_twice(filepath))
+        self.assertEqual([response["IpfsHash"] for response in responses], ["QmPinned", "QmPinned"])
+        self.assertEqual(len(self.paths("/data/testAuthentication")), 1)
+        upload = self.requests[-1]
+        self.assertEqual(int(upload.headers["Content-Length"]), len(upload.content))
+        self.assertIn(b'filename="coll1.png"', upload.content)
+        self.assertIn(data, upload.content)
+
+    def test_auth_cached_across_repos(self):
+        asyncio.run(self.pin_twice(Path(__file__)))
+        self.requests.clear()
+        asyncio.run(self.pin_twice(Path(__file__)))
+        self.assertEqual(self.paths("/data/testAuthentication"), [])
+
+    def test_failed_auth(self):
+        self.auth_ok = False
+        self.assertEqual(asyncio.run(self.pin_twice(Path(__file__))), [None, None])
+        self.assertEqual(self.paths("/pinning/pinFileToIPFS"), [])
+
+    def test_list_all_pages(self):
+        async def run():
+            async with self.repo() as repo:
+                return [row async for row in repo.list_all(name_prefix="coll", page_size=2)]
+        rows = asyncio.run(run())
+        self.assertEqual([row["ipfs_pin_hash"] for row in rows], ["QmOld", "QmTwo", "QmNew", "QmThree"])
+        self.assertEqual(len(self.paths("/data/pinList")), 3)
+
+    def test_name_index_and_sync(self):
+        async def run(index):
+            async with self.repo() as repo:
+                return await repo.name_index(name_prefix="coll"), await index.sync_async(repo)
+        with pin_index.PinIndex(Path(self.tmp.name) / "pin-index.db") as index:
+            names, synced = asyncio.run(run(index))
+            self.assertEqual(names, {"coll1.json": "QmNew", "coll2.json": "QmTwo", "coll3.json": "QmThree"})
+            self.assertEqual(index.name_index(name_prefix="coll"), names)
+        self.assertEqual(synced["unpinned"], 0)
+
+class RawQueueHandlerTestSuite(unittest.TestCase):
+    """RawQueueHandler leaves formatting to the queue listener."""
+
+    def record(self, msg, args=(), exc_info=None):
+        return logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, exc_info)
+
+    def prepare(self, record):
+        return utils.RawQueueHandler(queue.SimpleQueue()).prepare(record)
+
+    def test_plain_args_not_formatted(self):
+        prepared = self.prepare(self.record("MINT[%s] %d", ("a.json", 3)))
+        self.assertEqual((prepared.msg, prepared.args), ("MINT[%s] %d", ("a.json", 3)))
+        self.assertEqual(prepared.getMessage(), "MINT[a.json] 3")
+
+    def test_mutable_args_merged(self):
+        entry = {"state": "signed"}
+        prepared = self.prepare(self.record("JOURNAL %s", (entry,)))
+        entry["state"] = "validated"
+        self.assertEqual(prepared.getMessage(), "JOURNAL {'state': 'signed'}")
+
+    def test_exc_info_rendered(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = self.record("FAILED", exc_info=sys.exc_info())
+        prepared = self.prepare(record)
+        self.assertIsNone(prepared.exc_info)
+        self.assertIn("ValueError: boom", prepared.exc_text)
+        self.assertIsNotNone(record.exc_info)
+        for formatter in (logging.Formatter("%(message)s"), utils.JsonLineFormatter()):
+            self.assertIn("ValueError: boom", formatter.format(prepared))
+
+    def test_listener_formats(self):
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        listener = QueueListener(queue.SimpleQueue(), handler)
+        log = logging.getLogger("raw-queue-test")
+        log.propagate = False
+        log.addHandler(utils.RawQueueHandler(listener.queue))
+        listener.start()
+        log.warning("PIN[%s] => IPFS", "a.png")
+        listener.stop()
+        self.assertEqual(stream.getvalue(), "WARNING PIN[a.png] => IPFS\n")
+
+class FakeClient:
+    """Websocket client stand-in that counts reconnects."""
+
+    instances = []
+
+    def __init__(self, url):
+        self.url = url
+        self.reopened = 0
+        FakeClient.instances.append(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+    async def close(self):
+        return None
+
+    async def open(self):
+        self.reopened += 1
+
+class FakeNFT:
+    """XRPLNFT stand-in whose submits play back scripted outcomes per index."""
+
+    outcomes = {}
+
+    def __init__(self, issuer, uri, network_url):
+        self.index = int(uri.rsplit("coll", 1)[1].split(".")[0])
+
+    def prepare_mint_tx(self, taxon, flags, transfer_fee):
+        return None
+
+    async def sign_mint_tx(self, wallet, client):
+        self.sequence = self.index
+        self.max_ledger = 100
+        return f"H{self.index}"
+
+    async def submit_mint_tx(self, client):
+        outcome = FakeNFT.outcomes[self.index].pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.mint_response = Response(
+            status=ResponseStatus.SUCCESS,
+            result={"meta": {"TransactionResult": outcome}},
+        )
+        return self.mint_response.status
+
+class MintCollectionTestSuite(unittest.TestCase):
+    """mint_nft_collection against a stubbed client and NFT."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = journal.MintJournal(Path(self.tmp.name) / "mint-journal.log", 7)
+        FakeClient.instances = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def mint(self, outcomes):
+        FakeNFT.outcomes = outcomes
+        config = {"collection": "coll", "collection_id": 7, "transfer_fee": 0}
+        uris = {f"coll{index}.json": f"ipfs://cid/coll{index}.json" for index in outcomes}
+        account = mock.Mock()
+        with mock.patch.object(mint_nft, "AsyncWebsocketClient", FakeClient), \
+                mock.patch.object(mint_nft, "XRPLNFT", FakeNFT), \
+                mock.patch("asyncio.sleep", mock.AsyncMock()):
+            asyncio.run(mint_nft.mint_nft_collection(
+                config=config,
+                account=account,
+                issuer="rIssuer",
+                network_url="wss://test",
+                flags=[],
+                start=min(outcomes),
+                end=max(outcomes),
+                nft_uris=uris,
+                journal=self.journal,
+                logger=logging.getLogger("mint-test"),
+                dedup=False,
+            ))
+        return journal.MintJournal.replay(self.journal.path, 7)
+
+    def test_failed_tokens_do_not_stop_the_range(self):
+        entries = self.mint({
+            1: ["tesSUCCESS"],
+            2: [XRPLReliableSubmissionException("latest ledger passed")],
+            3: ["tecINSUFFICIENT_RESERVE"],
+            4: [XRPLRequestFailureException({"error": "txnNotFound"})],
+            5: ["tesSUCCESS"],
+        })
+        states = {index: (entry["state"], entry["result"]) for index, entry in entries.items()}
+        self.assertEqual(states, {
+            1: (journal.VALIDATED, "tesSUCCESS"),
+            2: (journal.FAILED, "expired"),
+            3: (journal.FAILED, "tecINSUFFICIENT_RESERVE"),
+            4: (journal.SUBMITTED, None),
+            5: (journal.VALIDATED, "tesSUCCESS"),
+        })
+
+    def test_retry_reconnects(self):
+        entries = self.mint({1: [ConnectionError("dropped"), "tesSUCCESS"]})
+        self.assertEqual(entries[1]["state"], journal.VALIDATED)
+        self.assertEqual(FakeClient.instances[0].reopened, 1)
+
 if __name__ == '__main__':
     unittest.main()
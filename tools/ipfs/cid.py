@@ -0,0 +1,140 @@
+import hashlib
+from base64 import b32encode
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+# go-ipfs / Pinata defaults for `ipfs add`: fixed 256KiB chunks laid out as a
+# balanced DAG of up to 174 links per node, CIDv0 with dag-pb leaves, or
+# CIDv1 with raw leaves.
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+SHARD_THRESHOLD = 262144
+
+CODEC_RAW = 0x55
+CODEC_DAG_PB = 0x70
+SHA2_256 = 0x12
+
+UNIXFS_DIRECTORY = 1
+UNIXFS_FILE = 2
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _field_varint(field: int, value: int) -> bytes:
+    return _varint(field << 3) + _varint(value)
+
+def _field_bytes(field: int, data: bytes) -> bytes:
+    return _varint((field << 3) | 2) + _varint(len(data)) + data
+
+def _unixfs(kind: int, data: bytes = None, filesize: int = None, blocksizes: List[int] = ()) -> bytes:
+    out = _field_varint(1, kind)
+    if data:
+        out += _field_bytes(2, data)
+    if filesize is not None:
+        out += _field_varint(3, filesize)
+    for size in blocksizes:
+        out += _field_varint(4, size)
+    return out
+
+def _pb_node(links: List[Tuple[bytes, str, int]], data: bytes) -> bytes:
+    """dag-pb encoding: Links (field 2) precede Data (field 1)"""
+    out = b""
+    for cid, name, tsize in links:
+        link = _field_bytes(1, cid) + _field_bytes(2, name.encode("utf-8")) + _field_varint(3, tsize)
+        out += _field_bytes(2, link)
+    return out + _field_bytes(1, data)
+
+def _multihash(block: bytes) -> bytes:
+    return bytes([SHA2_256, 32]) + hashlib.sha256(block).digest()
+
+def _cid_bytes(block: bytes, codec: int, version: int) -> bytes:
+    if version == 0:
+        return _multihash(block)
+    return _varint(1) + _varint(codec) + _multihash(block)
+
+def b58encode(data: bytes) -> str:
+    num = int.from_bytes(data, "big")
+    out = ""
+    while num:
+        num, rem = divmod(num, 58)
+        out = B58_ALPHABET[rem] + out
+    pad = len(data) - len(data.lstrip(b"\0"))
+    return "1" * pad + out
+
+def cid_to_str(cid: bytes) -> str:
+    if cid[0] == SHA2_256:
+        return b58encode(cid)
+    return "b" + b32encode(cid).decode("ascii").lower().rstrip("=")
+
+class DagNode:
+    """ A node of the file DAG: CID, cumulative DAG size and file bytes covered """
+
+    def __init__(self, cid: bytes, tsize: int, filesize: int) -> None:
+        self.cid = cid
+        self.tsize = tsize
+        self.filesize = filesize
+
+def _leaf(chunk: bytes, version: int) -> DagNode:
+    if version == 0:
+        block = _pb_node([], _unixfs(UNIXFS_FILE, chunk, len(chunk)))
+        return DagNode(_cid_bytes(block, CODEC_DAG_PB, 0), len(block), len(chunk))
+    return DagNode(_cid_bytes(chunk, CODEC_RAW, 1), len(chunk), len(chunk))
+
+def _parent(children: List[DagNode], version: int) -> DagNode:
+    filesize = sum(child.filesize for child in children)
+    data = _unixfs(UNIXFS_FILE, None, filesize, [child.filesize for child in children])
+    block = _pb_node([(child.cid, "", child.tsize) for child in children], data)
+    tsize = len(block) + sum(child.tsize for child in children)
+    return DagNode(_cid_bytes(block, CODEC_DAG_PB, version), tsize, filesize)
+
+def file_node(path: Path, version: int = 0, chunk_size: int = CHUNK_SIZE) -> DagNode:
+    """Build the balanced UnixFS DAG for a file and return its root"""
+    level = []
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk and level:
+                break
+            level.append(_leaf(chunk, version))
+            if len(chunk) < chunk_size:
+                break
+    while len(level) > 1:
+        level = [
+            _parent(level[i:i+MAX_LINKS], version)
+            for i in range(0, len(level), MAX_LINKS)
+        ]
+    return level[0]
+
+def file_cid(path: Path, version: int = 0) -> str:
+    return cid_to_str(file_node(path, version).cid)
+
+def file_cids(paths: List[Path], version: int = 0, workers: int = 8) -> Dict[Path, str]:
+    """CIDs of many files, hashed in parallel (hashlib releases the GIL)"""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(lambda path: file_cid(path, version), paths)))
+
+def directory_cid(paths: List[Path], version: int = 0, workers: int = 8) -> Tuple[str, Dict[str, str]]:
+    """CID of a flat directory holding paths, plus the CID of each entry.
+
+    Matches a wrapped directory upload. Directories large enough to be
+    HAMT-sharded by the IPFS node are not supported; pin those in chunks.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        nodes = dict(zip(paths, pool.map(lambda path: file_node(path, version), paths)))
+    links = sorted(
+        ((node.cid, path.name, node.tsize) for path, node in nodes.items()),
+        key=lambda link: link[1].encode("utf-8"),
+    )
+    if sum(len(cid) + len(name) for cid, name, _ in links) > SHARD_THRESHOLD:
+        raise ValueError("directory is large enough to be sharded, pin it in smaller chunks")
+    block = _pb_node(links, _unixfs(UNIXFS_DIRECTORY))
+    entries = {path.name: cid_to_str(node.cid) for path, node in nodes.items()}
+    return cid_to_str(_cid_bytes(block, CODEC_DAG_PB, version)), entries
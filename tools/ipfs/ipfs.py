@@ -1,15 +1,28 @@
 import requests
+import httpx
 import json
+import uuid
+import time
+import asyncio
+import hashlib
+import threading
 from pathlib import Path
-from typing import Dict
+from typing import AsyncIterator, Dict, Iterator, List, Tuple
+from datetime import datetime, timezone
 from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
 
 DEFAULT_PROVIDER = "Pinata"
+DEFAULT_POOL_SIZE = 20
 PINATA_AUTH_ENDPOINT = "https://api.pinata.cloud/data/testAuthentication"
 PINATA_PIN_ENDPOINT = "https://api.pinata.cloud/pinning/pinFileToIPFS"
 PINATA_UNPIN_ENDPOINT = "https://api.pinata.cloud/pinning/unpin"
 PINATA_LIST_ENDPOINT = "https://api.pinata.cloud/data/pinList"
+PINATA_LIST_PAGE_LIMIT = 1000
+STREAM_BLOCK_SIZE = 1024 * 1024
 PINATA_AUTH_RESPONSE = "Congratulations! You are communicating with the Pinata API!"
+AUTH_CACHE_FILE = Path.home() / ".cache" / "aqrl" / "ipfs-auth.json"
+AUTH_TTL = 3600
 
 @dataclass
 class IPFSFile:
@@ -19,8 +32,170 @@ class IPFSFile:
     pintime: str
     pinurl: str
 
+class MultipartFileStream:
+    """ multipart/form-data body that streams its files from disk
+
+    The total length is known up front so the upload is sent with a
+    Content-Length, but only one read-sized block is held in memory.
+    """
+
+    def __init__(self, fields: List[Tuple[str, str]], files: List[Tuple[str, Path]]) -> None:
+        self.boundary = uuid.uuid4().hex
+        self.parts = []
+        for name, value in fields:
+            self.parts.append(
+                self._header(f'form-data; name="{name}"') + value.encode("utf-8") + b"\r\n"
+            )
+        for filename, path in files:
+            self.parts.append(self._header(
+                f'form-data; name="file"; filename="{filename}"',
+                "application/octet-stream",
+            ))
+            self.parts.append(path)
+            self.parts.append(b"\r\n")
+        self.parts.append(f"--{self.boundary}--\r\n".encode("utf-8"))
+        self.length = sum(
+            part.stat().st_size if isinstance(part, Path) else len(part)
+            for part in self.parts
+        )
+        self.buffer = b""
+        self.chunks = self._chunks()
+
+    def _header(self, disposition: str, content_type: str = None) -> bytes:
+        header = f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+        if content_type:
+            header += f"Content-Type: {content_type}\r\n"
+        return (header + "\r\n").encode("utf-8")
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def _chunks(self, block_size: int = STREAM_BLOCK_SIZE) -> Iterator[bytes]:
+        for part in self.parts:
+            if isinstance(part, Path):
+                with part.open("rb") as f:
+                    while True:
+                        block = f.read(block_size)
+                        if not block:
+                            break
+                        yield block
+            else:
+                yield part
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.chunks
+
+    async def achunks(self) -> AsyncIterator[bytes]:
+        """The same blocks, each read on a worker thread so disk reads never block the event loop"""
+        while True:
+            chunk = await asyncio.to_thread(next, self.chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+def _directory_stream(files: List[Path], dirname: str) -> MultipartFileStream:
+    fields = [
+        ("pinataMetadata", json.dumps({"name": dirname})),
+        ("pinataOptions", json.dumps({"cidVersion": 0})),
+    ]
+    return MultipartFileStream(fields, [(f"{dirname}/{path.name}", path) for path in files])
+
+def _auth_key(provider: str, api_key: str, api_secret: str) -> str:
+    """Cache key for a credential pair; the secret itself is never written"""
+    return hashlib.sha256(f"{provider}:{api_key}:{api_secret}".encode("utf-8")).hexdigest()
+
+def _read_auth_cache(cache_file: Path) -> Dict[str, float]:
+    try:
+        with cache_file.open("r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def cached_auth(cache_file: Path, key: str, ttl: int) -> bool:
+    """True if key authenticated successfully within the last ttl seconds"""
+    if ttl <= 0:
+        return False
+    verified = _read_auth_cache(cache_file).get(key)
+    return verified is not None and time.time() - verified < ttl
+
+def store_auth(cache_file: Path, key: str, ttl: int) -> None:
+    if ttl <= 0:
+        return None
+    now = time.time()
+    cache = {
+        k: verified
+        for k, verified in _read_auth_cache(cache_file).items()
+        if now - verified < ttl
+    }
+    cache[key] = now
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(".tmp")
+        with tmp.open("w") as f:
+            json.dump(cache, f)
+        tmp.replace(cache_file)
+    except OSError:
+        pass
+
+def _list_payload(
+    name_prefix: str,
+    pin_start: str,
+    pin_end: str,
+    status: str,
+    page_size: int,
+    unpin_start: str = None,
+) -> Dict:
+    if pin_end is None:
+        pin_end = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    payload = {
+        "status": status,
+        "pageLimit": page_size,
+        "pinEnd": pin_end,
+    }
+    if pin_start:
+        payload["pinStart"] = pin_start
+    if unpin_start:
+        payload["unpinStart"] = unpin_start
+    if name_prefix:
+        payload["metadata[name]"] = name_prefix
+    return payload
+
+def _matches_prefix(row: Dict, name_prefix: str) -> bool:
+    name = (row.get("metadata") or {}).get("name") or ""
+    return not name_prefix or name.startswith(name_prefix)
+
+def _fold_name_index(rows) -> Dict[str, str]:
+    index = {}
+    pinned = {}
+    for row in rows:
+        name = row["metadata"]["name"]
+        if name not in pinned or row["date_pinned"] > pinned[name]:
+            index[name] = row["ipfs_pin_hash"]
+            pinned[name] = row["date_pinned"]
+    return index
+
 class IPFSRepo:
-    """ Connector for IPFS Account, defaults to Pinata """
+    """ Connector for IPFS Account, defaults to Pinata
+
+    Credentials are checked on the first call that needs them, not on
+    construction, and a successful check is cached in auth_cache for
+    auth_ttl seconds (0 disables the cache).
+    """
 
     def __init__(
         self,
@@ -31,6 +206,9 @@ class IPFSRepo:
         pin_endpoint: str = PINATA_PIN_ENDPOINT,
         unpin_endpoint: str = PINATA_UNPIN_ENDPOINT,
         list_endpoint: str = PINATA_LIST_ENDPOINT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        auth_cache: Path = AUTH_CACHE_FILE,
+        auth_ttl: int = AUTH_TTL,
     ) -> None:
         self.provider = provider
         self.auth_url = auth_endpoint
@@ -41,10 +219,41 @@ class IPFSRepo:
             "pinata_api_key": api_key,
             "pinata_secret_api_key": api_secret,
         }
-        self.auth = self.do_auth()
+        self.auth_cache = Path(auth_cache)
+        self.auth_ttl = auth_ttl
+        self.auth_key = _auth_key(provider, api_key, api_secret)
+        # one keep-alive pool shared by every call and worker thread
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._auth = None
+        self.auth_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    @property
+    def auth(self) -> bool:
+        with self.auth_lock:
+            if self._auth is None:
+                if cached_auth(self.auth_cache, self.auth_key, self.auth_ttl):
+                    self._auth = True
+                else:
+                    self._auth = self.do_auth()
+                    if self._auth:
+                        store_auth(self.auth_cache, self.auth_key, self.auth_ttl)
+            return self._auth
 
     def do_auth(self) -> bool:
-        self.auth_response = requests.get(self.auth_url, headers=self.headers)
+        self.auth_response = self.session.get(self.auth_url)
         resp = json.loads(self.auth_response.text)
         if self.provider == "Pinata":
             return resp["message"] == PINATA_AUTH_RESPONSE
@@ -56,44 +265,234 @@ class IPFSRepo:
         with filepath.open(mode="rb") as f:
             files = {"file": f}
             try:
-                response = requests.post(
+                response = self.session.post(
                                 self.pin_url,
-                                headers=self.headers,
                                 files=files
                            )
                 return json.loads(response.text)
             except requests.exceptions.RequestException as e:
                 return None
 
+    def pin_directory(self, files: List[Path], dirname: str) -> Dict:
+        """Pin files as one directory, addressable as ipfs://<IpfsHash>/<file name>"""
+        if not self.auth:
+            return None
+        stream = _directory_stream(files, dirname)
+        try:
+            response = self.session.post(
+                            self.pin_url,
+                            data=stream,
+                            headers={"Content-Type": stream.content_type},
+                        )
+            return json.loads(response.text)
+        except requests.exceptions.RequestException as e:
+            return None
+
     def unpin(self, filehash: str) -> str:
         if not self.auth:
             return None
         unpin_url = self.unpin_url + "/" + filehash
         try:
-            response = requests.delete(
-                            unpin_url,
-                            headers=self.headers,
-                        )
+            response = self.session.delete(unpin_url)
             return response.text
         except requests.exceptions.RequestException as e:
             return None
 
+    def list_all(
+        self,
+        name_prefix: str = None,
+        pin_start: str = None,
+        pin_end: str = None,
+        status: str = "pinned",
+        page_size: int = PINATA_LIST_PAGE_LIMIT,
+        unpin_start: str = None,
+    ) -> Iterator[Dict]:
+        """Yield every pin row, paging through pinList by offset.
+
+        pinEnd is pinned to the sweep start so rows pinned meanwhile cannot
+        shift the pages. Dates are ISO 8601 strings as Pinata expects.
+        """
+        if not self.auth:
+            return None
+        payload = _list_payload(name_prefix, pin_start, pin_end, status, page_size, unpin_start)
+        offset = 0
+        while True:
+            payload["pageOffset"] = offset
+            response = self.session.get(self.list_url, params=payload)
+            response.raise_for_status()
+            rows = json.loads(response.text)["rows"]
+            for row in rows:
+                if _matches_prefix(row, name_prefix):
+                    yield row
+            if len(rows) < page_size:
+                break
+            offset += page_size
+
+    def name_index(self, name_prefix: str = None, pin_start: str = None) -> Dict[str, str]:
+        """Map pin name to CID, keeping the most recent pin of each name"""
+        return _fold_name_index(self.list_all(name_prefix=name_prefix, pin_start=pin_start))
+
     def get(self, filename: str) -> Dict:
         if not self.auth:
             return None
         payload = {"status": "pinned", "metadata[name]": filename}
         try:
-            response = requests.get(
+            response = self.session.get(
                             self.list_url,
-                            headers=self.headers,
                             params=payload,
                         )
             return json.loads(response.text)
         except requests.exceptions.RequestException as e:
             return None
 
+class AsyncIPFSRepo:
+    """ asyncio connector for IPFS Account with the same API as IPFSRepo
+
+    Use as an async context manager; every call shares one pooled
+    keep-alive httpx client. Uploads stream from disk a block at a time on
+    a worker thread, and authentication is lazy and cached as in IPFSRepo.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        provider: str = DEFAULT_PROVIDER,
+        auth_endpoint: str = PINATA_AUTH_ENDPOINT,
+        pin_endpoint: str = PINATA_PIN_ENDPOINT,
+        unpin_endpoint: str = PINATA_UNPIN_ENDPOINT,
+        list_endpoint: str = PINATA_LIST_ENDPOINT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        auth_cache: Path = AUTH_CACHE_FILE,
+        auth_ttl: int = AUTH_TTL,
+        transport: httpx.AsyncBaseTransport = None,
+    ) -> None:
+        self.provider = provider
+        self.auth_url = auth_endpoint
+        self.pin_url = pin_endpoint
+        self.unpin_url = unpin_endpoint
+        self.list_url = list_endpoint
+        self.headers = {
+            "pinata_api_key": api_key,
+            "pinata_secret_api_key": api_secret,
+        }
+        self.auth_cache = Path(auth_cache)
+        self.auth_ttl = auth_ttl
+        self.auth_key = _auth_key(provider, api_key, api_secret)
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+            ),
+            timeout=None,
+            transport=transport,
+        )
+        self._auth = None
+        self.auth_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    async def auth(self) -> bool:
+        # created here so the lock belongs to the running event loop
+        if self.auth_lock is None:
+            self.auth_lock = asyncio.Lock()
+        async with self.auth_lock:
+            if self._auth is None:
+                if cached_auth(self.auth_cache, self.auth_key, self.auth_ttl):
+                    self._auth = True
+                else:
+                    self._auth = await self.do_auth()
+                    if self._auth:
+                        store_auth(self.auth_cache, self.auth_key, self.auth_ttl)
+            return self._auth
+
+    async def do_auth(self) -> bool:
+        self.auth_response = await self.client.get(self.auth_url)
+        resp = json.loads(self.auth_response.text)
+        if self.provider == "Pinata":
+            return resp["message"] == PINATA_AUTH_RESPONSE
+        return False
+
+    async def _post_stream(self, stream: MultipartFileStream) -> Dict:
+        try:
+            response = await self.client.post(
+                            self.pin_url,
+                            content=stream.achunks(),
+                            headers={
+                                "Content-Type": stream.content_type,
+                                "Content-Length": str(len(stream)),
+                            },
+                        )
+            return json.loads(response.text)
+        except httpx.HTTPError as e:
+            return None
+
+    async def pin(self, filepath: Path) -> Dict:
+        if not await self.auth():
+            return None
+        return await self._post_stream(MultipartFileStream([], [(filepath.name, filepath)]))
 
+    async def pin_directory(self, files: List[Path], dirname: str) -> Dict:
+        """Pin files as one directory, addressable as ipfs://<IpfsHash>/<file name>"""
+        if not await self.auth():
+            return None
+        return await self._post_stream(_directory_stream(files, dirname))
 
+    async def unpin(self, filehash: str) -> str:
+        if not await self.auth():
+            return None
+        unpin_url = self.unpin_url + "/" + filehash
+        try:
+            response = await self.client.delete(unpin_url)
+            return response.text
+        except httpx.HTTPError as e:
+            return None
 
+    async def list_all(
+        self,
+        name_prefix: str = None,
+        pin_start: str = None,
+        pin_end: str = None,
+        status: str = "pinned",
+        page_size: int = PINATA_LIST_PAGE_LIMIT,
+        unpin_start: str = None,
+    ) -> AsyncIterator[Dict]:
+        """Yield every pin row, paging through pinList by offset as IPFSRepo.list_all does"""
+        if not await self.auth():
+            return
+        payload = _list_payload(name_prefix, pin_start, pin_end, status, page_size, unpin_start)
+        offset = 0
+        while True:
+            payload["pageOffset"] = offset
+            response = await self.client.get(self.list_url, params=payload)
+            response.raise_for_status()
+            rows = json.loads(response.text)["rows"]
+            for row in rows:
+                if _matches_prefix(row, name_prefix):
+                    yield row
+            if len(rows) < page_size:
+                break
+            offset += page_size
 
+    async def name_index(self, name_prefix: str = None, pin_start: str = None) -> Dict[str, str]:
+        """Map pin name to CID, keeping the most recent pin of each name"""
+        rows = [row async for row in self.list_all(name_prefix=name_prefix, pin_start=pin_start)]
+        return _fold_name_index(rows)
 
+    async def get(self, filename: str) -> Dict:
+        if not await self.auth():
+            return None
+        payload = {"status": "pinned", "metadata[name]": filename}
+        try:
+            response = await self.client.get(self.list_url, params=payload)
+            return json.loads(response.text)
+        except httpx.HTTPError as e:
+            return None
@@ -3,17 +3,17 @@ import sys
 import json
 import logging
 from ipfs import IPFSRepo, IPFSFile
-from ipfs_utils import load_config, get_logger
+from ipfs_utils import load_config, get_logger, configure_logging
+from retry import retry_call, configure_retry
+from pin_index import PinIndex, DEFAULT_INDEX_FILE
 from pathlib import Path
 from typing import Dict
 from pprint import PrettyPrinter
 
-def list_file(config: Dict, repo: IPFSRepo, file_name: str) -> Dict:
-    response = None
-    retries = 3
-    while not response and retries != 0:
-        response = repo.get(file_name)
-        retries -= 1
+def list_file(config: Dict, repo: IPFSRepo, file_name: str, index: PinIndex = None) -> Dict:
+    if index:
+        return index.get(file_name)
+    response = retry_call("ipfs.get", repo.get, file_name, retry_if=lambda r: not r)
     if not response:
         return None
     return response
@@ -40,16 +40,35 @@ def list_file(config: Dict, repo: IPFSRepo, file_name: str) -> Dict:
     type=click.STRING,
     help='Logfile to record runtime info'
 )
-def list_files(config_file, file_name, log_file) -> None:
+@click.option(
+    '--index_file',
+    default=DEFAULT_INDEX_FILE,
+    type=Path,
+    help='Local pin index to answer from, synced with the pin list first'
+)
+@click.option(
+    '-r',
+    '--remote',
+    is_flag=True,
+    help='Query the pin list directly instead of the local index'
+)
+def list_files(config_file, file_name, log_file, index_file, remote) -> None:
     logger = get_logger(__name__, log_file)
     config = load_config(config_file)
+    configure_logging(config)
+    configure_retry(config)
     pp = PrettyPrinter(width=41, compact=True)
     ipfs_repo = IPFSRepo(
                     api_key=config["pinata_api_key"],
                     api_secret=config["pinata_api_secret"],
                 )
+    pin_index = None
+    if not remote:
+        pin_index = PinIndex(index_file)
+        synced = pin_index.sync(ipfs_repo)
+        logger.info(f"SYNC {index_file} +{synced['pinned']} -{synced['unpinned']}")
     logger.info(f"Getting info for {file_name}")
-    result = list_file(config, ipfs_repo, file_name)
+    result = list_file(config, ipfs_repo, file_name, pin_index)
     logger.info(f"Result: {result}")
     pp.pprint(result)
     return None
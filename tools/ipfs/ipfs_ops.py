@@ -3,6 +3,7 @@ import click
 from ipfs_pin import pin_files
 from ipfs_unpin import unpin_files
 from ipfs_list import list_files
+from ipfs_prefetch import prefetch_files
 
 @click.group()
 def main():
@@ -11,6 +12,7 @@ def main():
 main.add_command(pin_files)
 main.add_command(unpin_files)
 main.add_command(list_files)
+main.add_command(prefetch_files)
 
 if __name__ == "__main__":
     main()
@@ -5,18 +5,25 @@ import boto3
 import time
 import logging
 from ipfs import IPFSRepo, IPFSFile
-from ipfs_utils import load_config, get_s3_file, update_json_with_url, get_logger
+from ipfs_utils import load_config, get_s3_file, update_json_with_url, get_logger, configure_s3_cache, configure_logging
+from ipfs_pipeline import PinPipeline, make_job, write_failures
+from pin_index import PinIndex, DEFAULT_INDEX_FILE
+from cid import directory_cid
+from retry import retry_call, configure_retry, log_retry_stats
+from tracing import span, configure_tracing, finish_tracing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Set, Tuple
 
-def pin_to_ipfs(config: Dict, repo: IPFSRepo, filepath: Path) -> IPFSFile:
-    response = repo.pin(filepath)
-    retries = 3
-    while not response and retries != 0:
-        response = repo.pin(filepath)
-        retries -= 1
-    if not response:
+def pin_failed(response: Dict) -> bool:
+    return not response or "IpfsHash" not in response
+
+def pin_to_ipfs(config: Dict, repo: IPFSRepo, filepath: Path, index: PinIndex = None) -> IPFSFile:
+    response = retry_call("ipfs.pin", repo.pin, filepath, retry_if=pin_failed)
+    if pin_failed(response):
         return None
+    if index:
+        index.record_pin(filepath.name, response)
     return IPFSFile(
                 pinhash=response["IpfsHash"],
                 pinsize=response["PinSize"],
@@ -24,94 +31,136 @@ def pin_to_ipfs(config: Dict, repo: IPFSRepo, filepath: Path) -> IPFSFile:
                 pinurl=config["pinata_gateway"]+response["IpfsHash"]
             )
 
-def pin_s3_file_to_ipfs(
+def pin_directory_chunks(
         ipfs_repo: IPFSRepo,
-        config: Dict,
-        s3_source_uri: str,
-        local_dest_path: str,
         logger,
-        do_fetch: bool = True,
-        do_pin: bool = True,
-    ):
-    s3_fetch = None
-    if do_fetch:
-        logger.info(f"S3[{s3_source_uri}] => {local_dest_path}")
-        retries = 3
-        while not s3_fetch and retries != 0:
-            s3_fetch = get_s3_file(
-                            bucket=config["s3_bucket"],
-                            file_key=s3_source_uri,
-                            output_path=local_dest_path,
-                        )
-            retries -= 1
-    else:
-        s3_fetch = True
-    if do_pin and s3_fetch:
-        logger.info(f"PIN[{local_dest_path}] => IPFS")
-        ipfs_file = pin_to_ipfs(config, ipfs_repo, Path(local_dest_path))
-        logger.info(f"IPFS: {ipfs_file.pinurl}")
-        return ipfs_file
-    elif s3_fetch:
-        return s3_fetch
-    else:
-        return None
+        files: List[Tuple[int, Path]],
+        dirname: str,
+        chunk_size: int,
+        index: PinIndex = None,
+        pinned: Set[str] = None,
+    ) -> List[Dict]:
+    """Pin (index, path) pairs as directories of up to chunk_size files each
 
+    Each directory's CID is computed locally first: directories already in
+    pinned are not uploaded again, and an upload that comes back with a
+    different CID is reported.
+    """
+    chunks = []
+    step = chunk_size or len(files)
+    for offset in range(0, len(files), step):
+        chunk = files[offset:offset+step]
+        name = f"{dirname}-{chunk[0][0]}-{chunk[-1][0]}"
+        paths = [path for _, path in chunk]
+        try:
+            local_cid, _ = directory_cid(paths)
+        except ValueError as e:
+            logger.warning(f"NO LOCAL CID[{name}]: {e}")
+            local_cid = None
+        if pinned and local_cid in pinned:
+            logger.info(f"SKIP DIR[{name}] already pinned as {local_cid}")
+            dir_cid = local_cid
+        else:
+            logger.info(f"PIN DIR[{name}] {len(chunk)} files => IPFS")
+            with span("pin.directory", dirname=name, files=len(chunk)):
+                response = retry_call(
+                                "ipfs.pin_directory",
+                                ipfs_repo.pin_directory,
+                                paths,
+                                name,
+                                retry_if=pin_failed,
+                            )
+            if pin_failed(response):
+                raise IOError(f"directory pin of {name} failed: {response}")
+            if index:
+                index.record_pin(name, response)
+            dir_cid = response["IpfsHash"]
+            if local_cid and dir_cid != local_cid:
+                logger.warning(f"CID MISMATCH DIR[{name}] local {local_cid} pinned {dir_cid}")
+        logger.info(f"IPFS DIR: ipfs://{dir_cid}")
+        chunks.append({
+            "cid": dir_cid,
+            "start": chunk[0][0],
+            "end": chunk[-1][0],
+            "dirname": name,
+        })
+    return chunks
 
-def process_image_and_json(
+def pin_collection_directories(
         ipfs_repo: IPFSRepo,
         config: Dict,
         logger,
-        image_num: int
-    ) -> bool:
-    logger.info(f"Processing Image and JSON for Index: {image_num}")
+        start: int,
+        end: int,
+        chunk_size: int,
+        fetch_workers: int,
+        record_file: Path,
+        index: PinIndex = None,
+        pinned: Set[str] = None,
+    ) -> Dict:
+    """Pin images, then rewritten JSON, as wrapped directory uploads.
+
+    Token URIs become ipfs://<dirCID>/<name>; the chunk CIDs and index
+    ranges are written to record_file so the minter can derive every URI
+    without querying the pin list.
+    """
     collection = config["collection"]
-    image = str(image_num) + ".png"
-    json_meta = str(image_num) + ".json"
-    image_output_dir = config["image_dir"]
-    json_output_dir = config["json_dir"]
-    s3_image = config["s3_image_dir"]+image
-    s3_json = config["s3_json_dir"]+json_meta
-    image_out_dir_path = Path(image_output_dir)
-    json_out_dir_path = Path(json_output_dir)
-    if not image_out_dir_path.exists():
-        image_out_dir_path.mkdir(parents=True)
-    if not json_out_dir_path.exists():
-        json_out_dir_path.mkdir(parents=True)
-    output_image = image_output_dir + collection + image
-    output_json = json_output_dir + collection + json_meta
-    ipfs_image = pin_s3_file_to_ipfs(
-                    ipfs_repo,
-                    config,
-                    s3_image,
-                    output_image,
-                    logger
+    jobs = [make_job(config, image_num) for image_num in range(start, end+1)]
+    for path in (Path(config["image_dir"]), Path(config["json_dir"])):
+        if not path.exists():
+            path.mkdir(parents=True)
+    fetches = [
+        (s3_key, path)
+        for job in jobs
+        for s3_key, path in ((job.s3_image, job.image_path), (job.s3_json, job.json_path))
+        if not path.exists()
+    ]
+    def fetch(item: Tuple[str, Path]) -> bool:
+        logger.info(f"S3[{item[0]}] => {item[1]}")
+        return retry_call(
+                    "s3.get",
+                    get_s3_file,
+                    config["s3_bucket"],
+                    item[0],
+                    str(item[1]),
+                    retry_if=lambda fetched: not fetched,
                 )
-    json_fetch = pin_s3_file_to_ipfs(
-                    ipfs_repo,
-                    config,
-                    s3_json,
-                    output_json,
-                    logger,
-                    do_pin=False
-                )
-    if ipfs_image and json_fetch:
+    with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+        for (s3_key, path), ok in zip(fetches, pool.map(fetch, fetches)):
+            if not ok:
+                raise IOError(f"fetch of {s3_key} failed")
+    image_chunks = pin_directory_chunks(
+                        ipfs_repo,
+                        logger,
+                        [(job.index, job.image_path) for job in jobs],
+                        collection + "-images",
+                        chunk_size,
+                        index,
+                        pinned,
+                    )
+    image_dirs = {}
+    for chunk in image_chunks:
+        for image_num in range(chunk["start"], chunk["end"]+1):
+            image_dirs[image_num] = chunk["cid"]
+    for job in jobs:
         update_json_with_url(
-            Path(output_json),
-            "ipfs://"+ipfs_image.pinhash
+            job.json_path,
+            f"ipfs://{image_dirs[job.index]}/{job.image_path.name}"
         )
-        ipfs_json = pin_s3_file_to_ipfs(
+    json_chunks = pin_directory_chunks(
                         ipfs_repo,
-                        config,
-                        s3_json,
-                        output_json,
                         logger,
-                        do_fetch=False
+                        [(job.index, job.json_path) for job in jobs],
+                        collection + "-json",
+                        chunk_size,
+                        index,
+                        pinned,
                     )
-        logger.info("Success")
-        return True
-    else:
-        logger.error("Fetch or pin failed")
-    return False
+    record = {"images": image_chunks, "json": json_chunks}
+    with record_file.open("w", encoding="utf-8") as f:
+        logger.info(f"DUMP DIR PINS => {record_file}")
+        json.dump(record, f, ensure_ascii=False, indent=4)
+    return record
 
 @click.command(help="PIN files to IPFS")
 @click.option(
@@ -146,21 +195,105 @@ def process_image_and_json(
     type=click.INT,
     help='End index of file in collection to pin'
 )
+@click.option(
+    '--fetch_workers',
+    default=8,
+    type=click.INT,
+    help='Concurrent S3 downloads'
+)
+@click.option(
+    '--pin_workers',
+    default=4,
+    type=click.INT,
+    help='Concurrent IPFS uploads for each of the image and JSON stages'
+)
+@click.option(
+    '--max_attempts',
+    default=3,
+    type=click.INT,
+    help='Attempts per stage before an index is recorded as failed'
+)
+@click.option(
+    '--failure_file',
+    default="pin-failures.json",
+    type=Path,
+    help='File to record indices that failed after all attempts'
+)
+@click.option(
+    '--prefetched',
+    is_flag=True,
+    help='Use files already fetched by prefetch_files instead of downloading them'
+)
+@click.option(
+    '--skip_pinned',
+    is_flag=True,
+    help='Compute CIDs locally and skip files, or directories in --dir_mode, already in the pin list'
+)
+@click.option(
+    '--dir_mode',
+    is_flag=True,
+    help='Pin the range as wrapped directory uploads instead of file by file'
+)
+@click.option(
+    '--chunk_size',
+    default=0,
+    type=click.INT,
+    help='Files per directory upload in dir mode, 0 pins the range as one directory'
+)
+@click.option(
+    '--dir_pins_file',
+    default="dir-pins.json",
+    type=Path,
+    help='File to record directory CIDs and their index ranges in dir mode'
+)
+@click.option(
+    '--index_file',
+    default=DEFAULT_INDEX_FILE,
+    type=Path,
+    help='Local pin index to record pins in and check for pinned files'
+)
+@click.option(
+    '--trace_file',
+    type=Path,
+    help='Write per-index stage spans here as a Chrome trace and log a latency report'
+)
 @click.option(
     '-d',
     '--dry_run',
     is_flag=True,
 )
-def pin_files(config_file, log_file, file_name, start, end, dry_run) -> None:
+def pin_files(
+    config_file,
+    log_file,
+    file_name,
+    start,
+    end,
+    fetch_workers,
+    pin_workers,
+    max_attempts,
+    failure_file,
+    prefetched,
+    skip_pinned,
+    dir_mode,
+    chunk_size,
+    dir_pins_file,
+    index_file,
+    trace_file,
+    dry_run,
+) -> None:
     logger = get_logger(__name__, log_file)
     config = load_config(config_file)
+    configure_logging(config)
+    configure_s3_cache(config)
+    configure_retry(config)
+    configure_tracing(trace_file)
     ipfs_repo = IPFSRepo(
                     api_key=config["pinata_api_key"],
                     api_secret=config["pinata_api_secret"],
                 )
-    if file_name.exists():
+    if file_name and file_name.exists():
         logger.info(f"PIN[{file_name}] => IPFS")
-        ipfs_file = pin_to_ipfs(config, ipfs_repo, file_name)
+        ipfs_file = pin_to_ipfs(config, ipfs_repo, file_name, PinIndex(index_file))
         if ipfs_file:
             logger.info(f"IPFS GATEWAY URL: {ipfs_file.pinurl}")
             logger.info(f"IPFS URL: ipfs://{ipfs_file.pinhash}")
@@ -174,10 +307,41 @@ def pin_files(config_file, log_file, file_name, start, end, dry_run) -> None:
     if dry_run:
         logger.info(f"Would process {start} to {end}")
         return None
-    for image_num in range(start, end+1):
-        result = process_image_and_json(ipfs_repo, config, logger, image_num)
-        if result:
-            logger.info(f"Image {image_num} processed successfully")
-        else:
-            logger.error("Failed to process {image_num}")
-            return None
+    pin_index = PinIndex(index_file)
+    pinned = None
+    if skip_pinned:
+        synced = pin_index.sync(ipfs_repo)
+        logger.info(f"SYNC {index_file} +{synced['pinned']} -{synced['unpinned']}")
+        pinned = pin_index.cids()
+        logger.info(f"Found {len(pinned)} pinned CIDs in {index_file}")
+    if dir_mode:
+        pin_collection_directories(
+            ipfs_repo,
+            config,
+            logger,
+            start,
+            end,
+            chunk_size,
+            fetch_workers,
+            dir_pins_file,
+            pin_index,
+            pinned,
+        )
+        finish_tracing(logger, trace_file)
+        return None
+    pipeline = PinPipeline(
+                    config,
+                    ipfs_repo,
+                    logger,
+                    fetch_workers=fetch_workers,
+                    pin_workers=pin_workers,
+                    max_attempts=max_attempts,
+                    do_fetch=not prefetched,
+                    pinned=pinned,
+                    index=pin_index,
+                )
+    jobs = pipeline.run(start, end)
+    failed = write_failures(jobs, failure_file)
+    logger.info(f"Processed {len(jobs) - failed} of {len(jobs)}, failures => {failure_file}")
+    log_retry_stats(logger)
+    finish_tracing(logger, trace_file)
@@ -0,0 +1,208 @@
+import json
+import time
+import queue
+import threading
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Set
+from ipfs import IPFSRepo
+from cid import file_cid
+from pin_index import PinIndex
+import retry
+from retry import RetryPolicy, TransientError, retry_call
+from ipfs_utils import get_s3_file, update_json_with_url
+from tracing import span
+
+@dataclass
+class PinJob:
+    """ One collection index moving through the pin pipeline """
+    index: int
+    s3_image: str
+    s3_json: str
+    image_path: Path
+    json_path: Path
+    image_cid: str = None
+    json_cid: str = None
+    stage: str = None
+    error: str = None
+    queued_at: float = None
+    attempts: Dict[str, int] = field(default_factory=dict)
+
+@dataclass
+class Stage:
+    """ A pipeline step with its own bounded queue and worker pool """
+    name: str
+    work: Callable[[PinJob], None]
+    workers: int
+    inbox: queue.Queue = None
+    threads: List[threading.Thread] = field(default_factory=list)
+
+def make_job(config: Dict, image_num: int) -> PinJob:
+    collection = config["collection"]
+    image = str(image_num) + ".png"
+    json_meta = str(image_num) + ".json"
+    return PinJob(
+        index=image_num,
+        s3_image=config["s3_image_dir"] + image,
+        s3_json=config["s3_json_dir"] + json_meta,
+        image_path=Path(config["image_dir"] + collection + image),
+        json_path=Path(config["json_dir"] + collection + json_meta),
+    )
+
+class PinPipeline:
+    """ S3 fetch -> pin image -> rewrite JSON -> pin JSON, overlapped across indices
+
+    Every stage pulls from a bounded queue served by its own thread pool, so
+    a slow stage applies back-pressure instead of buffering the whole range.
+    A failing step is retried with backoff up to max_attempts times; after
+    that, or at once for a fatal error, the index is recorded as failed and
+    the rest of the range carries on. Files whose locally computed CID is in
+    pinned are not uploaded again, and new pins are recorded in index.
+    """
+
+    def __init__(
+        self,
+        config: Dict,
+        repo: IPFSRepo,
+        logger,
+        fetch_workers: int = 8,
+        pin_workers: int = 4,
+        rewrite_workers: int = 2,
+        queue_size: int = 32,
+        max_attempts: int = 3,
+        do_fetch: bool = True,
+        pinned: Set[str] = None,
+        index: PinIndex = None,
+    ) -> None:
+        self.config = config
+        self.repo = repo
+        self.logger = logger
+        default = retry.DEFAULT_POLICY
+        self.policy = RetryPolicy(
+            attempts=max_attempts,
+            base_delay=default.base_delay,
+            max_delay=default.max_delay,
+            budget=default.budget,
+        )
+        self.do_fetch = do_fetch
+        self.pinned = pinned
+        self.index = index
+        self.results = queue.Queue()
+        self.stages = [
+            Stage("fetch", self.fetch, fetch_workers),
+            Stage("pin_image", self.pin_image, pin_workers),
+            Stage("rewrite_json", self.rewrite_json, rewrite_workers),
+            Stage("pin_json", self.pin_json, pin_workers),
+        ]
+        for stage in self.stages:
+            stage.inbox = queue.Queue(maxsize=queue_size)
+
+    def fetch(self, job: PinJob) -> None:
+        if not self.do_fetch:
+            return None
+        for s3_key, path in ((job.s3_image, job.image_path), (job.s3_json, job.json_path)):
+            self.logger.info(f"S3[{s3_key}] => {path}")
+            if not get_s3_file(self.config["s3_bucket"], s3_key, str(path)):
+                raise TransientError(f"fetch of {s3_key} failed")
+
+    def _pin(self, path: Path) -> str:
+        if self.pinned:
+            local_cid = file_cid(path)
+            if local_cid in self.pinned:
+                self.logger.info(f"SKIP[{path}] already pinned as {local_cid}")
+                return local_cid
+        self.logger.info(f"PIN[{path}] => IPFS")
+        response = self.repo.pin(path)
+        if not response or "IpfsHash" not in response:
+            raise TransientError(f"pin of {path} failed: {response}")
+        if self.index:
+            self.index.record_pin(path.name, response)
+        return response["IpfsHash"]
+
+    def pin_image(self, job: PinJob) -> None:
+        job.image_cid = self._pin(job.image_path)
+
+    def rewrite_json(self, job: PinJob) -> None:
+        update_json_with_url(job.json_path, "ipfs://" + job.image_cid)
+
+    def pin_json(self, job: PinJob) -> None:
+        job.json_cid = self._pin(job.json_path)
+
+    def _attempt(self, stage: Stage, job: PinJob) -> None:
+        job.attempts[stage.name] = job.attempts.get(stage.name, 0) + 1
+        stage.work(job)
+
+    def _serve(self, position: int) -> None:
+        stage = self.stages[position]
+        while True:
+            job = stage.inbox.get()
+            if job is None:
+                break
+            job.stage = stage.name
+            try:
+                with span(
+                    "pin." + stage.name,
+                    job.queued_at,
+                    collection=self.config["collection"],
+                    index=job.index,
+                ):
+                    retry_call(
+                        "pipeline." + stage.name,
+                        self._attempt,
+                        stage,
+                        job,
+                        policy=self.policy,
+                        logger=self.logger,
+                    )
+                job.error = None
+            except Exception as e:
+                job.error = str(e)
+            if job.error:
+                self.results.put(job)
+            elif position + 1 < len(self.stages):
+                job.queued_at = time.perf_counter()
+                self.stages[position + 1].inbox.put(job)
+            else:
+                self.results.put(job)
+
+    def _feed(self, indices) -> None:
+        for image_num in indices:
+            job = make_job(self.config, image_num)
+            job.queued_at = time.perf_counter()
+            self.stages[0].inbox.put(job)
+
+    def run(self, start: int, end: int) -> Dict[int, PinJob]:
+        for path in (Path(self.config["image_dir"]), Path(self.config["json_dir"])):
+            if not path.exists():
+                path.mkdir(parents=True)
+        for position, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self._serve, args=(position,), daemon=True)
+                thread.start()
+                stage.threads.append(thread)
+        indices = range(start, end+1)
+        feeder = threading.Thread(target=self._feed, args=(indices,), daemon=True)
+        feeder.start()
+        done = {}
+        while len(done) < len(indices):
+            job = self.results.get()
+            done[job.index] = job
+            if job.error:
+                self.logger.error(f"Failed to process {job.index} at {job.stage}: {job.error}")
+            else:
+                self.logger.info(f"Image {job.index} processed successfully ipfs://{job.json_cid}")
+        for stage in self.stages:
+            for _ in stage.threads:
+                stage.inbox.put(None)
+            for thread in stage.threads:
+                thread.join()
+        return done
+
+def write_failures(jobs: Dict[int, PinJob], failure_file: Path) -> int:
+    failed = {
+        job.index: {"stage": job.stage, "error": job.error, "attempts": job.attempts}
+        for job in jobs.values() if job.error
+    }
+    with failure_file.open("w", encoding="utf-8") as f:
+        json.dump(failed, f, ensure_ascii=False, indent=4, sort_keys=True)
+    return len(failed)
@@ -0,0 +1,162 @@
+import time
+import click
+import ipfs_utils
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ipfs_utils import load_config, get_logger, get_s3_client, get_s3_file, configure_s3_cache, configure_logging
+from retry import retry_call, configure_retry, log_retry_stats
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True,
+)
+
+def list_prefix(bucket: str, prefix: str) -> Dict[str, int]:
+    """Map every key under prefix to its size with one paginated listing"""
+    listing = {}
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            listing[obj["Key"]] = obj["Size"]
+    return listing
+
+def plan_downloads(
+        config: Dict,
+        listing: Dict[str, int],
+        start: int,
+        end: int,
+        force: bool = False,
+    ) -> Tuple[List[Tuple[str, Path, int]], List[str]]:
+    """Downloads needed for the range, skipping local files of the same size
+
+    Local JSON is rewritten in place once its image is pinned, so any
+    existing JSON file is kept unless force is set.
+    """
+    collection = config["collection"]
+    plan = []
+    missing = []
+    for image_num in range(start, end+1):
+        for s3_dir, out_dir, ext, keep in (
+            (config["s3_image_dir"], config["image_dir"], ".png", False),
+            (config["s3_json_dir"], config["json_dir"], ".json", not force),
+        ):
+            key = s3_dir + str(image_num) + ext
+            path = Path(out_dir + collection + str(image_num) + ext)
+            if key not in listing:
+                missing.append(key)
+            elif not path.exists():
+                plan.append((key, path, listing[key]))
+            elif not keep and path.stat().st_size != listing[key]:
+                plan.append((key, path, listing[key]))
+    return plan, missing
+
+def _download(bucket: str, key: str, path: Path) -> bool:
+    if ipfs_utils.S3_CACHE:
+        return get_s3_file(bucket, key, str(path))
+    get_s3_client().download_file(
+        Bucket=bucket,
+        Key=key,
+        Filename=str(path),
+        Config=TRANSFER_CONFIG,
+    )
+    return path.exists()
+
+def download(bucket: str, key: str, path: Path) -> bool:
+    return retry_call("s3.get", _download, bucket, key, path, retry_if=lambda ok: not ok)
+
+@click.command(help="PREFETCH collection files from S3 in bulk")
+@click.option(
+    '-c',
+    '--config_file',
+    required=True,
+    type=Path,
+    help='Config file with secrets and details about collection to pin'
+)
+@click.option(
+    '-l',
+    '--log_file',
+    default="ipfs_prefetch.log",
+    type=click.STRING,
+    help='Logfile to record runtime info'
+)
+@click.option(
+    '-s',
+    '--start',
+    type=click.INT,
+    help='Start index of file in collection to fetch'
+)
+@click.option(
+    '-e',
+    '--end',
+    type=click.INT,
+    help='End index of file in collection to fetch'
+)
+@click.option(
+    '-w',
+    '--workers',
+    default=16,
+    type=click.INT,
+    help='Concurrent downloads'
+)
+@click.option(
+    '-f',
+    '--force',
+    is_flag=True,
+    help='Also refetch existing JSON whose size differs from S3, discarding pinned image urls'
+)
+@click.option(
+    '-d',
+    '--dry_run',
+    is_flag=True,
+)
+def prefetch_files(config_file, log_file, start, end, workers, force, dry_run) -> None:
+    logger = get_logger(__name__, log_file)
+    config = load_config(config_file)
+    configure_logging(config)
+    configure_s3_cache(config)
+    configure_retry(config)
+    bucket = config["s3_bucket"]
+    if not start:
+        start = config["start_idx"]
+    if not end:
+        end = config["end_idx"]
+    for out_dir in (Path(config["image_dir"]), Path(config["json_dir"])):
+        if not out_dir.exists():
+            out_dir.mkdir(parents=True)
+    listing = list_prefix(bucket, config["s3_image_dir"])
+    listing.update(list_prefix(bucket, config["s3_json_dir"]))
+    plan, missing = plan_downloads(config, listing, start, end, force)
+    for key in missing:
+        logger.error(f"MISSING S3[{key}]")
+    total_bytes = sum(size for _, _, size in plan)
+    logger.info(f"PLAN {len(plan)} objects, {total_bytes / 1e6:.1f}MB for {start} to {end}")
+    if dry_run:
+        return None
+    began = time.monotonic()
+    fetched = 0
+    fetched_bytes = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(download, bucket, key, path): (key, size)
+            for key, path, size in plan
+        }
+        for future in as_completed(futures):
+            key, size = futures[future]
+            try:
+                if future.result():
+                    fetched += 1
+                    fetched_bytes += size
+                    continue
+                logger.error(f"FAILED S3[{key}]")
+            except Exception as e:
+                logger.error(f"FAILED S3[{key}]: {e}")
+    elapsed = max(time.monotonic() - began, 1e-9)
+    logger.info(
+        f"FETCHED {fetched}/{len(plan)} objects, {fetched_bytes / 1e6:.1f}MB in {elapsed:.1f}s "
+        f"= {fetched_bytes / 1e6 / elapsed:.2f}MB/s, {fetched / elapsed:.1f} objects/s"
+    )
+    log_retry_stats(logger)
@@ -1,22 +1,21 @@
 import click
-import time
 import sys
 import json
 import logging
 from ipfs import IPFSRepo, IPFSFile
-from ipfs_utils import load_config, get_logger
+import retry
+from ipfs_utils import load_config, get_logger, TokenBucket, configure_logging
+from retry import RetryPolicy, retry_call, configure_retry, log_retry_stats
+from pin_index import PinIndex, DEFAULT_INDEX_FILE
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List
+
+# Pinata's published API limit
+PINATA_REQUESTS_PER_MINUTE = 180
 
 def unpin_from_ipfs(config: Dict, repo: IPFSRepo, filehash: str) -> bool:
-    response = None
-    retries = 3
-    while not response and retries != 0:
-        response = repo.unpin(filehash)
-        time.sleep(2)
-        retries -= 1
-    if not response:
-        return False
+    response = retry_call("ipfs.unpin", repo.unpin, filehash, retry_if=lambda r: r != "OK")
     return response == "OK"
 
 def unpin_file(
@@ -24,33 +23,39 @@ def unpin_file(
         config: Dict,
         logger,
         file_name: str,
+        index: PinIndex = None,
     ) -> bool:
-    retries = 3
-    data = None
-    while retries != 0:
-        data = ipfs_repo.get(file_name)
-        time.sleep(2)
-        retries -= 1
-        if "rows" in data:
-            break
-    if not data or "rows" not in data:
+    if index:
+        data = index.get(file_name)
+    else:
+        data = retry_call(
+                    "ipfs.get",
+                    ipfs_repo.get,
+                    file_name,
+                    retry_if=lambda r: not r or "rows" not in r,
+                )
+    if not data or not data.get("rows"):
         return False
     filehash = data["rows"][0]["ipfs_pin_hash"]
     logger.info(f"UNPIN[{file_name}]")
-    return unpin_from_ipfs(config, ipfs_repo, filehash)
+    unpinned = unpin_from_ipfs(config, ipfs_repo, filehash)
+    if unpinned and index:
+        index.record_unpin(filehash)
+    return unpinned
 
 def process_image_and_json(
         ipfs_repo: IPFSRepo,
         config: Dict,
         logger,
-        image_num: int
+        image_num: int,
+        index: PinIndex = None,
     ) -> bool:
     logger.info(f"Processing Image and JSON for Index: {image_num}")
     collection = config["collection"]
     image = collection + str(image_num) + ".png"
     json_meta = collection + str(image_num) + ".json"
-    response_image = unpin_file(ipfs_repo, config, logger, image)
-    response_json = unpin_file(ipfs_repo, config, logger, json_meta)
+    response_image = unpin_file(ipfs_repo, config, logger, image, index)
+    response_json = unpin_file(ipfs_repo, config, logger, json_meta, index)
     if response_image and response_json:
         logger.info("Success")
         return True
@@ -58,6 +63,76 @@ def process_image_and_json(
         logger.error("Failed")
     return False
 
+def collection_cids(index: PinIndex, config: Dict, start: int, end: int) -> List[str]:
+    """CIDs of the range's images and JSON, looked up in the synced pin index"""
+    collection = config["collection"]
+    names = []
+    for image_num in range(start, end+1):
+        names.append(collection + str(image_num) + ".png")
+        names.append(collection + str(image_num) + ".json")
+    return sorted(index.cids(names))
+
+def synced_index(ipfs_repo: IPFSRepo, index_file: Path, logger) -> PinIndex:
+    """Open the local pin index and pull in the pin list changes since its last sync"""
+    pin_index = PinIndex(index_file)
+    synced = pin_index.sync(ipfs_repo)
+    logger.info(f"SYNC {index_file} +{synced['pinned']} -{synced['unpinned']}")
+    return pin_index
+
+def read_cid_file(cid_file: Path) -> List[str]:
+    """CIDs from a JSON list or a file with one CID per line"""
+    text = cid_file.read_text()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+def bulk_unpin(
+        ipfs_repo: IPFSRepo,
+        logger,
+        cids: List[str],
+        workers: int,
+        requests_per_minute: int,
+        attempts: int = 3,
+        index: PinIndex = None,
+    ) -> List[str]:
+    """Unpin CIDs concurrently, never exceeding the provider's request rate"""
+    bucket = TokenBucket(requests_per_minute / 60.0, capacity=workers)
+
+    policy = RetryPolicy(
+                attempts=attempts,
+                base_delay=retry.DEFAULT_POLICY.base_delay,
+                max_delay=retry.DEFAULT_POLICY.max_delay,
+                budget=retry.DEFAULT_POLICY.budget,
+            )
+
+    def limited_unpin(filehash: str) -> str:
+        bucket.acquire()
+        return ipfs_repo.unpin(filehash)
+
+    def unpin(filehash: str) -> bool:
+        response = retry_call(
+                        "ipfs.unpin",
+                        limited_unpin,
+                        filehash,
+                        policy=policy,
+                        retry_if=lambda r: r != "OK",
+                    )
+        if response == "OK":
+            logger.info(f"UNPINNED[{filehash}]")
+            if index:
+                index.record_unpin(filehash)
+            return True
+        return False
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for filehash, ok in zip(cids, pool.map(unpin, cids)):
+            if not ok:
+                logger.error(f"Failed to unpin {filehash}")
+                failed.append(filehash)
+    logger.info(f"Unpinned {len(cids) - len(failed)} of {len(cids)}")
+    return failed
+
 @click.command(help="UNPIN files from IPFS")
 @click.option(
     '-c',
@@ -91,31 +166,77 @@ def process_image_and_json(
     type=click.INT,
     help='End index of file in collection to unpin'
 )
+@click.option(
+    '-b',
+    '--bulk',
+    is_flag=True,
+    help='Unpin the range concurrently by CID from one pin list sweep'
+)
+@click.option(
+    '--cid_file',
+    type=Path,
+    help='In bulk mode, unpin the CIDs listed in this file instead of sweeping'
+)
+@click.option(
+    '-w',
+    '--workers',
+    default=8,
+    type=click.INT,
+    help='Concurrent unpin requests in bulk mode'
+)
+@click.option(
+    '--index_file',
+    default=DEFAULT_INDEX_FILE,
+    type=Path,
+    help='Local pin index to look up CIDs in, synced with the pin list first'
+)
 @click.option(
     '-d',
     '--dry_run',
     is_flag=True,
 )
-def unpin_files(config_file, log_file, file_name, start, end, dry_run) -> None:
+def unpin_files(config_file, log_file, file_name, start, end, bulk, cid_file, workers, index_file, dry_run) -> None:
     logger = get_logger(__name__, log_file)
     config = load_config(config_file)
+    configure_logging(config)
+    configure_retry(config)
     ipfs_repo = IPFSRepo(
                     api_key=config["pinata_api_key"],
                     api_secret=config["pinata_api_secret"],
                 )
     if file_name:
-        unpin_file(ipfs_repo, config, logger, file_name)
+        unpin_file(ipfs_repo, config, logger, file_name, synced_index(ipfs_repo, index_file, logger))
         return None
     if not start:
         start = config["start_idx"]
     if not end:
         end = config["end_idx"]
+    if bulk:
+        pin_index = None
+        if cid_file:
+            cids = read_cid_file(cid_file)
+        else:
+            pin_index = synced_index(ipfs_repo, index_file, logger)
+            cids = collection_cids(pin_index, config, start, end)
+        if dry_run:
+            logger.info(f"Would unpin {len(cids)} CIDs")
+            return None
+        bulk_unpin(
+            ipfs_repo,
+            logger,
+            cids,
+            workers,
+            config.get("pinata_requests_per_minute", PINATA_REQUESTS_PER_MINUTE),
+            index=pin_index or PinIndex(index_file),
+        )
+        log_retry_stats(logger)
+        return None
     if dry_run:
         logger.info(f"Would process {start} to {end}")
         return None
+    pin_index = synced_index(ipfs_repo, index_file, logger)
     for image_num in range(start, end+1):
-        result = process_image_and_json(ipfs_repo, config, logger, image_num)
-        time.sleep(2)
+        result = process_image_and_json(ipfs_repo, config, logger, image_num, pin_index)
         if result:
             logger.info(f"Image {image_num} processed successfully")
         else:
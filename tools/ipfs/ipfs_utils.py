@@ -1,11 +1,29 @@
+import os
 import sys
+import copy
 import json
+import re
+import queue
+import atexit
+import shutil
+import hashlib
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import threading
+import time
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from typing import Dict
 from pathlib import Path
 
 LOGGERS = {}
+S3_CLIENT = None
+S3_CACHE = None
+S3_LOCK = threading.Lock()
+S3_POOL_SIZE = 32
+S3_CHUNK_SIZE = 1024 * 1024
+S3_CACHE_MAX_BYTES = 10 * 1024 ** 3
 
 def load_config(config_path: Path) -> Dict:
     config_data = {}
@@ -13,8 +31,119 @@ def load_config(config_path: Path) -> Dict:
         config_data = json.load(f)
     return config_data
 
+def get_s3_client():
+    """Shared, thread-safe S3 client with a connection pool sized for workers"""
+    global S3_CLIENT
+    with S3_LOCK:
+        if S3_CLIENT is None:
+            S3_CLIENT = boto3.client(
+                "s3",
+                config=Config(max_pool_connections=S3_POOL_SIZE),
+            )
+    return S3_CLIENT
+
+class S3Cache:
+    """ Content-addressed local cache of S3 objects
+
+    Object bodies are stored once per ETag under objects/, and refs/ maps
+    each bucket/key to the ETag last seen for it. A cached key is
+    revalidated with a conditional GET, so unchanged objects cost one
+    304 round trip and no transfer. Least recently used bodies are evicted
+    once the cache grows past max_bytes. Downloads in progress are written
+    under tmp/, out of reach of eviction.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = S3_CACHE_MAX_BYTES) -> None:
+        self.objects = cache_dir / "objects"
+        self.refs = cache_dir / "refs"
+        self.tmp = cache_dir / "tmp"
+        for directory in (self.objects, self.refs, self.tmp):
+            directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.size = sum(entry.stat().st_size for entry in self.objects.iterdir())
+
+    def _ref_path(self, bucket: str, key: str) -> Path:
+        return self.refs / (hashlib.sha256(f"{bucket}/{key}".encode("utf-8")).hexdigest() + ".json")
+
+    def _blob_path(self, etag: str) -> Path:
+        return self.objects / hashlib.sha256(etag.encode("utf-8")).hexdigest()
+
+    def _store(self, bucket: str, key: str, response: Dict) -> Path:
+        etag = response["ETag"]
+        blob = self._blob_path(etag)
+        tmp = self.tmp / f"{blob.name}.{threading.get_ident()}"
+        with tmp.open("wb") as f:
+            for chunk in response["Body"].iter_chunks(S3_CHUNK_SIZE):
+                f.write(chunk)
+        existed = blob.exists()
+        os.replace(tmp, blob)
+        if not existed:
+            with self.lock:
+                self.size += blob.stat().st_size
+        with self._ref_path(bucket, key).open("w") as f:
+            json.dump({"bucket": bucket, "key": key, "etag": etag}, f)
+        return blob
+
+    def fetch(self, bucket: str, key: str, output_path: str) -> bool:
+        s3 = get_s3_client()
+        ref_path = self._ref_path(bucket, key)
+        blob = None
+        if ref_path.exists():
+            with ref_path.open() as f:
+                etag = json.load(f)["etag"]
+            if self._blob_path(etag).exists():
+                try:
+                    response = s3.get_object(Bucket=bucket, Key=key, IfNoneMatch=etag)
+                    blob = self._store(bucket, key, response)
+                except ClientError as e:
+                    if e.response["Error"]["Code"] not in ("304", "NotModified"):
+                        raise
+                    blob = self._blob_path(etag)
+        if blob is None:
+            blob = self._store(bucket, key, s3.get_object(Bucket=bucket, Key=key))
+        try:
+            os.utime(blob)
+            shutil.copyfile(blob, output_path)
+        except FileNotFoundError:
+            # evicted by another thread after the 304, fetch the body again
+            blob = self._store(bucket, key, s3.get_object(Bucket=bucket, Key=key))
+            shutil.copyfile(blob, output_path)
+        self.evict(keep=blob)
+        return Path(output_path).exists()
+
+    def evict(self, keep: Path = None) -> None:
+        with self.lock:
+            if self.size <= self.max_bytes:
+                return None
+            blobs = sorted(
+                (entry for entry in self.objects.iterdir() if entry != keep),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+            for blob in blobs:
+                if self.size <= self.max_bytes:
+                    break
+                try:
+                    size = blob.stat().st_size
+                    blob.unlink()
+                except FileNotFoundError:
+                    continue
+                self.size -= size
+
+def configure_s3_cache(config: Dict) -> S3Cache:
+    """Route get_s3_file through a local cache when config has s3_cache_dir"""
+    global S3_CACHE
+    if "s3_cache_dir" in config:
+        S3_CACHE = S3Cache(
+            Path(config["s3_cache_dir"]),
+            config.get("s3_cache_max_bytes", S3_CACHE_MAX_BYTES),
+        )
+    return S3_CACHE
+
 def get_s3_file(bucket: str, file_key: str, output_path: str) -> bool:
-    s3 = boto3.client("s3")
+    if S3_CACHE:
+        return S3_CACHE.fetch(bucket, file_key, output_path)
+    s3 = get_s3_client()
     s3.download_file(
         Bucket=bucket,
         Key=file_key,
@@ -23,6 +152,28 @@ def get_s3_file(bucket: str, file_key: str, output_path: str) -> bool:
     output = Path(output_path)
     return output.exists()
 
+class TokenBucket:
+    """ Thread-safe token bucket: rate tokens per second, bursts up to capacity """
+
+    def __init__(self, rate: float, capacity: int = 1) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return None
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 def update_json_with_url(json_file: Path, pinurl: str) -> None:
     json_meta = {}
     with json_file.open() as f:
@@ -31,9 +182,121 @@ def update_json_with_url(json_file: Path, pinurl: str) -> None:
     with json_file.open("w", encoding="utf-8") as f:
         json.dump(json_meta, f, ensure_ascii=False, indent=4)
 
+TAG_PATTERN = re.compile(r"([A-Z][A-Z0-9_]*)(?=[\[\s:(]|$)")
+
+class JsonLineFormatter(logging.Formatter):
+    """ One JSON object per record, for log shippers and jq """
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "tag": log_tag(record.getMessage()),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line["exc"] = record.exc_text
+        return json.dumps(line, ensure_ascii=False)
+
+def log_tag(message: str) -> str:
+    """Leading uppercase tag of a message, e.g. PIN for PIN[a.png] => IPFS"""
+    match = TAG_PATTERN.match(message)
+    return match.group(1) if match else "OTHER"
+
+PLAIN_ARG_TYPES = (str, int, float, bool, type(None))
+
+def _plain_args(args) -> bool:
+    # a dict of named arguments can itself change after the call
+    return isinstance(args, tuple) and all(isinstance(value, PLAIN_ARG_TYPES) for value in args)
+
+class RawQueueHandler(QueueHandler):
+    """ Enqueues records unformatted; the listener's handlers format them
+
+    The stock prepare() formats every record on the calling thread. Here
+    plain %-style arguments travel as they are, while arguments that could
+    change before the listener gets to them are merged into the message,
+    and a traceback is rendered at once so the record holds no frames.
+    """
+
+    exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if not isinstance(record.msg, str) or (record.args and not _plain_args(record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class SamplingFilter(logging.Filter):
+    """ Keeps every nth INFO/DEBUG record of each tag; warnings and errors always pass
+
+    Runs before the record is queued, so a dropped record costs one count.
+    """
+
+    def __init__(self, every: int = 1) -> None:
+        super().__init__()
+        self.every = every
+        self.seen = {}
+        self.emitted = {}
+        self.levels = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        tag = log_tag(str(record.msg))
+        with self.lock:
+            seen = self.seen[tag] = self.seen.get(tag, 0) + 1
+            self.levels[record.levelname] = self.levels.get(record.levelname, 0) + 1
+            keep = record.levelno >= logging.WARNING or self.every <= 1 or seen % self.every == 1
+            if keep:
+                self.emitted[tag] = self.emitted.get(tag, 0) + 1
+        return keep
+
+def configure_logging(config: Dict) -> None:
+    """Apply log_json and log_sample_every from config to every logger made so far"""
+    for log, listener, sampler in LOGGERS.values():
+        sampler.every = config.get("log_sample_every", 1)
+        if config.get("log_json"):
+            for handler in listener.handlers:
+                handler.setFormatter(JsonLineFormatter())
+
+def log_summary(log, sampler: SamplingFilter) -> None:
+    with sampler.lock:
+        tags = sorted(sampler.seen.items(), key=lambda item: -item[1])
+        emitted = dict(sampler.emitted)
+        levels = sorted(sampler.levels.items())
+    if not tags:
+        return None
+    log.info(
+        "LOG SUMMARY " + " ".join(f"{level}={count}" for level, count in levels)
+        + " | " + " ".join(f"{tag}={emitted.get(tag, 0)}/{count}" for tag, count in tags)
+        + (f" | sampled 1 in {sampler.every}" if sampler.every > 1 else "")
+    )
+
+def shutdown_logging() -> None:
+    """Log each logger's summary, then drain and stop the queue listeners"""
+    for log, listener, sampler in list(LOGGERS.values()):
+        log_summary(log, sampler)
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    LOGGERS.clear()
+
 def get_logger(name: str, log_file: str, verbose: bool = True):
+    """Logger whose records are formatted and written by a background listener.
+
+    The calling thread only enqueues records, so worker threads and the
+    event loop never block on terminal or file I/O.
+    """
     if name in LOGGERS:
-        return LOGGERS[name]
+        return LOGGERS[name][0]
     log = logging.getLogger(name)
     handler = logging.StreamHandler(sys.stdout)
     file_handler = logging.FileHandler(filename=log_file)
@@ -48,7 +311,13 @@ def get_logger(name: str, log_file: str, verbose: bool = True):
     )
     handler.setFormatter(formatter)
     file_handler.setFormatter(formatter)
-    log.addHandler(handler)
-    log.addHandler(file_handler)
-    LOGGERS[name] = log
+    listener = QueueListener(queue.SimpleQueue(), handler, file_handler, respect_handler_level=True)
+    sampler = SamplingFilter()
+    queue_handler = RawQueueHandler(listener.queue)
+    queue_handler.addFilter(sampler)
+    log.addHandler(queue_handler)
+    listener.start()
+    if not LOGGERS:
+        atexit.register(shutdown_logging)
+    LOGGERS[name] = (log, listener, sampler)
     return log
@@ -0,0 +1,182 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+DEFAULT_INDEX_FILE = "pin-index.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pins (
+    name TEXT PRIMARY KEY,
+    cid TEXT NOT NULL,
+    size INTEGER,
+    date_pinned TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS pins_cid ON pins (cid);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def _to_row(name: str, cid: str, size: int, date_pinned: str, metadata: str) -> Dict:
+    """Shape an index entry like a Pinata pinList row"""
+    return {
+        "ipfs_pin_hash": cid,
+        "size": size,
+        "date_pinned": date_pinned,
+        "metadata": json.loads(metadata) if metadata else {"name": name},
+    }
+
+class PinIndex:
+    """ Local SQLite index of the pin list: name -> CID, size, pin date, metadata
+
+    The pin and unpin commands record their own changes as they go, and
+    sync() pulls only the rows pinned or unpinned since the last sync, so
+    lookups never need the network. The newest pin of a name wins.
+    """
+
+    def __init__(self, path: Path = Path(DEFAULT_INDEX_FILE)) -> None:
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _state(self, key: str) -> str:
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        self.conn.execute(
+            "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def _upsert(self, rows: Iterable[Dict]) -> int:
+        cursor = self.conn.executemany(
+            "INSERT INTO pins (name, cid, size, date_pinned, metadata) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET cid = excluded.cid, size = excluded.size, "
+            "date_pinned = excluded.date_pinned, metadata = excluded.metadata "
+            "WHERE excluded.date_pinned >= pins.date_pinned",
+            (
+                (
+                    row["metadata"]["name"],
+                    row["ipfs_pin_hash"],
+                    row.get("size"),
+                    row["date_pinned"],
+                    json.dumps(row["metadata"], sort_keys=True),
+                )
+                for row in rows
+                if (row.get("metadata") or {}).get("name")
+            ),
+        )
+        return cursor.rowcount
+
+    def record_pin(self, name: str, response: Dict) -> None:
+        """Add a pinFileToIPFS response under the name it was pinned as"""
+        with self.lock, self.conn:
+            self._upsert([{
+                "ipfs_pin_hash": response["IpfsHash"],
+                "size": response.get("PinSize"),
+                "date_pinned": response.get("Timestamp") or _now(),
+                "metadata": {"name": name},
+            }])
+
+    def record_unpin(self, cid: str, date_pinned: str = None) -> None:
+        """Drop a CID, or only its pins made no later than date_pinned"""
+        with self.lock, self.conn:
+            if date_pinned:
+                self.conn.execute(
+                    "DELETE FROM pins WHERE cid = ? AND date_pinned <= ?",
+                    (cid, date_pinned),
+                )
+            else:
+                self.conn.execute("DELETE FROM pins WHERE cid = ?", (cid,))
+
+    def _sync_window(self) -> Tuple[str, str]:
+        with self.lock:
+            return self._state("pin_start"), self._state("unpin_start")
+
+    def sync(self, repo) -> Dict[str, int]:
+        """Apply pins and unpins made since the last sync, a full sweep the first time"""
+        began = _now()
+        pin_start, unpin_start = self._sync_window()
+        pinned = list(repo.list_all(pin_start=pin_start))
+        unpinned = []
+        if unpin_start:
+            unpinned = list(repo.list_all(status="unpinned", unpin_start=unpin_start))
+        return self._apply_sync(pinned, unpinned, pin_start, began)
+
+    async def sync_async(self, repo) -> Dict[str, int]:
+        """sync() against an AsyncIPFSRepo"""
+        began = _now()
+        pin_start, unpin_start = self._sync_window()
+        pinned = [row async for row in repo.list_all(pin_start=pin_start)]
+        unpinned = []
+        if unpin_start:
+            unpinned = [row async for row in repo.list_all(status="unpinned", unpin_start=unpin_start)]
+        return self._apply_sync(pinned, unpinned, pin_start, began)
+
+    def _apply_sync(self, pinned: List[Dict], unpinned: List[Dict], pin_start: str, began: str) -> Dict[str, int]:
+        with self.lock, self.conn:
+            added = self._upsert(pinned)
+            for row in unpinned:
+                self.conn.execute(
+                    "DELETE FROM pins WHERE cid = ? AND date_pinned <= ?",
+                    (row["ipfs_pin_hash"], row["date_pinned"]),
+                )
+            latest = max([row["date_pinned"] for row in pinned] + [pin_start or ""])
+            if latest:
+                self._set_state("pin_start", latest)
+            self._set_state("unpin_start", began)
+        return {"pinned": added, "unpinned": len(unpinned)}
+
+    def get(self, name: str) -> Dict:
+        """Answer like IPFSRepo.get, a pinList response with the name's pin"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT name, cid, size, date_pinned, metadata FROM pins WHERE name = ?",
+                (name,),
+            ).fetchone()
+        rows = [_to_row(*row)] if row else []
+        return {"count": len(rows), "rows": rows}
+
+    def name_index(self, name_prefix: str = None) -> Dict[str, str]:
+        """Map pin name to CID like IPFSRepo.name_index"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, cid FROM pins WHERE substr(name, 1, ?) = ?",
+                (len(name_prefix or ""), name_prefix or ""),
+            ).fetchall()
+        return dict(rows)
+
+    def cids(self, names: Iterable[str] = None) -> Set[str]:
+        """CIDs pinned under names, or every CID in the index"""
+        if names is None:
+            with self.lock:
+                return set(cid for cid, in self.conn.execute("SELECT cid FROM pins"))
+        names = list(names)
+        found = set()
+        with self.lock:
+            for offset in range(0, len(names), 500):
+                batch = names[offset:offset+500]
+                query = "SELECT cid FROM pins WHERE name IN (%s)" % ",".join("?" * len(batch))
+                found.update(cid for cid, in self.conn.execute(query, batch))
+        return found
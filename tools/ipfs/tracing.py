@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+class Tracer:
+    """ Collects timed spans as Chrome trace events, loadable in Perfetto or chrome://tracing
+
+    Each span is one complete ("X") event on the track of the thread or
+    asyncio task that ran it, with its stage as the name and collection,
+    index and any other tags as args. A span given the time its job was
+    queued also records the wait before work started, as a separate
+    "<stage>.wait" event and in the stage report.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.events = []
+        self.tracks = {}
+        self.work = {}
+        self.waits = {}
+        self.lock = threading.Lock()
+
+    def _us(self, moment: float) -> float:
+        return round((moment - self.origin) * 1e6, 1)
+
+    def _track(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        name = task.get_name() if task else threading.current_thread().name
+        with self.lock:
+            if name not in self.tracks:
+                self.tracks[name] = len(self.tracks) + 1
+            return self.tracks[name]
+
+    def add(self, stage: str, began: float, ended: float, queued_at: float = None, **tags) -> None:
+        """Record a span measured elsewhere with time.perf_counter()"""
+        if not self.enabled:
+            return None
+        track = self._track()
+        event = {
+            "name": stage,
+            "cat": stage.split(".")[0],
+            "ph": "X",
+            "pid": os.getpid(),
+            "tid": track,
+            "ts": self._us(began),
+            "dur": round((ended - began) * 1e6, 1),
+            "args": tags,
+        }
+        with self.lock:
+            self.events.append(event)
+            self.work.setdefault(stage, []).append(ended - began)
+            if queued_at is not None:
+                self.waits.setdefault(stage, []).append(began - queued_at)
+                self.events.append(dict(
+                    event,
+                    name=stage + ".wait",
+                    ts=self._us(queued_at),
+                    dur=round((began - queued_at) * 1e6, 1),
+                ))
+
+    @contextmanager
+    def span(self, stage: str, queued_at: float = None, **tags):
+        if not self.enabled:
+            yield tags
+            return
+        began = time.perf_counter()
+        try:
+            yield tags
+        except BaseException as e:
+            tags["error"] = type(e).__name__
+            raise
+        finally:
+            self.add(stage, began, time.perf_counter(), queued_at, **tags)
+
+    def report(self) -> Dict[str, Dict]:
+        """Per stage count and p50/p95/max seconds of work, and of queue wait where known"""
+        with self.lock:
+            work = {stage: sorted(times) for stage, times in self.work.items()}
+            waits = {stage: sorted(times) for stage, times in self.waits.items()}
+        report = {}
+        for stage, times in work.items():
+            report[stage] = {"count": len(times), "work": _summary(times)}
+            if stage in waits:
+                report[stage]["wait"] = _summary(waits[stage])
+        return report
+
+    def write(self, trace_file: Path) -> int:
+        with self.lock:
+            events = list(self.events)
+            tracks = dict(self.tracks)
+        pid = os.getpid()
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": track, "args": {"name": name}}
+            for name, track in tracks.items()
+        ]
+        with Path(trace_file).open("w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def _summary(ordered: List[float]) -> Dict[str, float]:
+    return {
+        "p50": _percentile(ordered, 0.50),
+        "p95": _percentile(ordered, 0.95),
+        "max": ordered[-1],
+    }
+
+TRACER = Tracer()
+
+def configure_tracing(trace_file: Path) -> Tracer:
+    """Turn span collection on when a trace file was asked for"""
+    TRACER.enabled = trace_file is not None
+    return TRACER
+
+def span(stage: str, queued_at: float = None, **tags):
+    return TRACER.span(stage, queued_at, **tags)
+
+def finish_tracing(logger, trace_file: Path) -> None:
+    """Log the per-stage latency breakdown and write the trace file"""
+    if not TRACER.enabled:
+        return None
+    for stage, stats in sorted(TRACER.report().items()):
+        work = stats["work"]
+        line = (
+            f"TRACE {stage} n={stats['count']} "
+            f"work p50={work['p50']:.3f}s p95={work['p95']:.3f}s max={work['max']:.3f}s"
+        )
+        if "wait" in stats:
+            wait = stats["wait"]
+            line += f" wait p50={wait['p50']:.3f}s p95={wait['p95']:.3f}s max={wait['max']:.3f}s"
+        logger.info(line)
+    written = TRACER.write(trace_file)
+    logger.info(f"DUMP TRACE {written} events => {trace_file}")
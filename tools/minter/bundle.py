@@ -0,0 +1,134 @@
+import os
+import re
+import mmap
+import json
+import struct
+import click
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+from utils import load_config, get_logger, configure_logging
+
+BUNDLE_MAGIC = b"AQRLMB01"
+# index entry: token index, record offset, record length
+INDEX_ENTRY = struct.Struct("<qQI")
+# footer: index offset, entry count, magic
+FOOTER = struct.Struct("<QQ8s")
+
+def build_bundle(json_dir: Path, collection: str, output: Path) -> int:
+    """Pack every <collection><index>.json in json_dir into one bundle file.
+
+    Records are stored as compact JSON lines in index order, followed by a
+    fixed-width offset index and a footer pointing at it.
+    """
+    pattern = re.compile(re.escape(collection) + r"(\d+)\.json$")
+    files = []
+    with os.scandir(json_dir) as entries:
+        for entry in entries:
+            match = pattern.match(entry.name)
+            if match and entry.is_file():
+                files.append((int(match.group(1)), entry.path))
+    files.sort()
+    index = []
+    with output.open("wb") as out:
+        out.write(BUNDLE_MAGIC)
+        for num, path in files:
+            with open(path, "rb") as f:
+                record = json.dumps(
+                    json.load(f), ensure_ascii=False, separators=(",", ":")
+                ).encode("utf-8")
+            index.append((num, out.tell(), len(record)))
+            out.write(record + b"\n")
+        index_offset = out.tell()
+        for entry in index:
+            out.write(INDEX_ENTRY.pack(*entry))
+        out.write(FOOTER.pack(index_offset, len(index), BUNDLE_MAGIC))
+    return len(index)
+
+class MetadataBundle:
+    """ Memory-mapped random access to a packed metadata bundle """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.f = path.open("rb")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        footer = self.mm[len(self.mm) - FOOTER.size:]
+        index_offset, count, magic = FOOTER.unpack(footer)
+        if self.mm[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC or magic != BUNDLE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a metadata bundle")
+        self.offsets = {}
+        for num, offset, length in INDEX_ENTRY.iter_unpack(
+            self.mm[index_offset:index_offset + count * INDEX_ENTRY.size]
+        ):
+            self.offsets[num] = (offset, length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __contains__(self, num: int) -> bool:
+        return num in self.offsets
+
+    def close(self) -> None:
+        self.mm.close()
+        self.f.close()
+
+    def raw(self, num: int) -> bytes:
+        if num not in self.offsets:
+            return None
+        offset, length = self.offsets[num]
+        return self.mm[offset:offset + length]
+
+    def get(self, num: int) -> Dict:
+        record = self.raw(num)
+        if record is None:
+            return None
+        return json.loads(record)
+
+    def items(self) -> Iterator[Tuple[int, Dict]]:
+        """Stream every record in file order"""
+        for num, (offset, length) in self.offsets.items():
+            yield num, json.loads(self.mm[offset:offset + length])
+
+@click.command(help="Pack a metadata directory into a single bundle file")
+@click.option(
+    '-c',
+    '--config_file',
+    required=True,
+    type=Path,
+    help='Config file with secrets and details about collection to mint'
+)
+@click.option(
+    '-l',
+    '--log_file',
+    default="minter.log",
+    type=click.STRING,
+    help='Logfile to record runtime info'
+)
+@click.option(
+    '-j',
+    '--json_dir',
+    type=Path,
+    help='Metadata directory to pack, defaults to json_dir from config'
+)
+@click.option(
+    '-o',
+    '--output_file',
+    default="metadata.bundle",
+    type=Path,
+    help='Bundle file to write'
+)
+def bundle_metadata(config_file, log_file, json_dir, output_file) -> None:
+    logger = get_logger(__name__, log_file)
+    config = load_config(config_file)
+    configure_logging(config)
+    if not json_dir:
+        json_dir = Path(config["json_dir"])
+    logger.info(f"BUNDLE {json_dir} => {output_file}")
+    count = build_bundle(json_dir, config["collection"], output_file)
+    logger.info(f"BUNDLED {count} metadata records")
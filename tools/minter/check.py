@@ -1,24 +1,237 @@
 #!/usr/bin/env python3
-
+from context import (
+    XRPLAccount,
+    get_network_url,
+)
+import re
+import sys
 import json
+import asyncio
+import click
+import psycopg2
 from pathlib import Path
+from typing import Dict, List, Tuple
+from xrpl.utils import hex_to_str
+from mint_nft import decode_taxon
+from pin_index import PinIndex, DEFAULT_INDEX_FILE
+from utils import load_config, get_logger, configure_logging
+from records import RecordFile
+
+def uri_cid(uri: str) -> str:
+    """CID an ipfs:// URI points into, the directory CID for directory URIs"""
+    if not uri or not uri.startswith("ipfs://"):
+        return None
+    return uri[len("ipfs://"):].split("/", 1)[0]
+
+def load_uris(uri_record_file: Path, collection: str) -> Dict[int, str]:
+    pattern = re.compile(re.escape(collection) + r"(\d+)\.json$")
+    uris = {}
+    with RecordFile(uri_record_file) as entries:
+        for name, uri in entries.items():
+            match = pattern.match(name)
+            if match:
+                uris[int(match.group(1))] = uri
+    return uris
+
+def load_records(minted_nft_record_file: Path) -> Dict[int, Tuple[str, str]]:
+    """index -> (tokenID, uri) from the minted record file"""
+    with RecordFile(minted_nft_record_file) as records:
+        return {
+            int(num): (record.get("tokenID"), record.get("uri"))
+            for num, record in records.items()
+        }
+
+async def load_ledger(account: XRPLAccount, collection_id: int) -> Dict[int, List[Tuple[str, str]]]:
+    """index -> [(tokenID, uri)] of the collection's NFTs held by the issuer"""
+    ledger = {}
+    async for nft in account.iter_nfts():
+        if nft["Issuer"] != account.address:
+            continue
+        image_num, coll_id = decode_taxon(nft["NFTokenTaxon"])
+        if coll_id != collection_id:
+            continue
+        ledger.setdefault(image_num, []).append((nft["NFTokenID"], hex_to_str(nft["URI"])))
+    return ledger
+
+def load_db(db_url: str, table: str) -> Dict[str, str]:
+    """tokenID -> uri of every row in the table, read with a server-side cursor"""
+    conn = psycopg2.connect(db_url)
+    try:
+        cursor = conn.cursor(name="check_tokens")
+        cursor.itersize = 50000
+        cursor.execute(f"SELECT tokenID, uri FROM {table}")
+        return dict(cursor)
+    finally:
+        conn.close()
+
+def reconcile(
+    collection: str,
+    start: int,
+    end: int,
+    uris: Dict[int, str] = None,
+    records: Dict[int, Tuple[str, str]] = None,
+    ledger: Dict[int, List[Tuple[str, str]]] = None,
+    pins: Dict[str, str] = None,
+    db: Dict[str, str] = None,
+) -> Dict:
+    """Every difference between the stores that were loaded, in one pass over the range.
+
+    Stores left as None are skipped, along with the checks that need them.
+    """
+    report = {"collection": collection, "start": start, "end": end}
+    issues = {}
+
+    def flag(kind: str, item) -> None:
+        issues.setdefault(kind, []).append(item)
+
+    pinned_cids = set(pins.values()) if pins is not None else None
+    for image_num in range(start, end+1):
+        name = collection + str(image_num) + ".json"
+        uri = uris.get(image_num) if uris is not None else None
+        record = records.get(image_num) if records is not None else None
+        tokens = ledger.get(image_num, []) if ledger is not None else None
+        if uris is not None and uri is None:
+            flag("uri_missing", image_num)
+        if pins is not None and uri:
+            cid = uri_cid(uri)
+            if cid not in pinned_cids:
+                flag("uri_not_pinned", {"index": image_num, "uri": uri})
+            # only file URIs name the CID the JSON itself was pinned under
+            if uri == "ipfs://" + cid and name in pins and pins[name] != cid:
+                flag("pin_mismatch", {"index": image_num, "uri": uri, "pinned": pins[name]})
+        if tokens is not None:
+            if not tokens:
+                flag("not_minted", image_num)
+            if len(tokens) > 1:
+                flag("ledger_duplicates", {"index": image_num, "tokenIDs": [t for t, _ in tokens]})
+            for token_id, ledger_uri in tokens:
+                if uri and ledger_uri != uri:
+                    flag("ledger_uri_mismatch", {"index": image_num, "tokenID": token_id, "expected": uri, "actual": ledger_uri})
+        if records is not None:
+            if record is None:
+                if tokens:
+                    flag("unrecorded", image_num)
+            elif tokens is not None and record not in tokens:
+                flag("record_mismatch", {"index": image_num, "record": list(record), "ledger": [list(t) for t in tokens]})
+        if db is not None and record is not None:
+            token_id, record_uri = record
+            if token_id not in db:
+                flag("db_missing", {"index": image_num, "tokenID": token_id})
+            elif db[token_id] != record_uri:
+                flag("db_mismatch", {"index": image_num, "tokenID": token_id, "record": record_uri, "db": db[token_id]})
+    if ledger is not None:
+        for image_num in sorted(set(ledger) - set(range(start, end+1))):
+            flag("ledger_outside_range", {"index": image_num, "tokenIDs": [t for t, _ in ledger[image_num]]})
+    if db is not None and (ledger is not None or records is not None):
+        known = set()
+        if ledger is not None:
+            known.update(token_id for tokens in ledger.values() for token_id, _ in tokens)
+        if records is not None:
+            known.update(token_id for token_id, _ in records.values())
+        for token_id in sorted(set(db) - known):
+            flag("db_orphans", token_id)
+    report["loaded"] = [
+        store for store, data in (
+            ("uris", uris), ("records", records), ("ledger", ledger), ("pins", pins), ("db", db),
+        ) if data is not None
+    ]
+    report["counts"] = {kind: len(items) for kind, items in sorted(issues.items())}
+    report["ok"] = not issues
+    report["issues"] = issues
+    return report
 
-def checkuris(inputf: Path):
-    with inputf.open("r") as f:
-        entries = json.load(f)
-    for num in range(1, 10001):
-        name = "potpetz" + str(num) + ".json"
-        if name not in entries:
-            print(f"MISSING: {num}: {name}")
-
-def checknfts(inputf: Path):
-    with inputf.open("r") as f:
-        entries = json.load(f)
-    for num in range(1, 10001):
-        if str(num) not in entries:
-            print(f"MISSING RECORD: {num}")
-
-
-if __name__ == "__main__":
-    checkuris(Path("uris.json"))
-    checknfts(Path("minted.json"))
+@click.command(help="Reconcile URIs, minted records, ledger, pin index and DB for a collection")
+@click.option(
+    '-c',
+    '--config_file',
+    required=True,
+    type=Path,
+    help='Config file with secrets and details about collection to check'
+)
+@click.option(
+    '-l',
+    '--log_file',
+    default="minter.log",
+    type=click.STRING,
+    help='Logfile to record runtime info'
+)
+@click.option(
+    '-u',
+    '--uri_file',
+    type=Path,
+    help='URI map written by mint_nfts --create_uris'
+)
+@click.option(
+    '-m',
+    '--minted_nft_record_file',
+    type=Path,
+    help='Minted record file written by mint_nfts --get_mints'
+)
+@click.option(
+    '--ledger',
+    is_flag=True,
+    help='Page through the issuer account NFTs on the ledger'
+)
+@click.option(
+    '--index_file',
+    type=Path,
+    help=f'Local pin index to check URIs against, e.g. {DEFAULT_INDEX_FILE}'
+)
+@click.option(
+    '--db',
+    is_flag=True,
+    help='Read tokenID and uri of every row in the DB table'
+)
+@click.option(
+    '-o',
+    '--output',
+    default="check-report.json",
+    type=Path,
+    help='File to write the machine readable report to'
+)
+@click.option(
+    '-s',
+    '--start',
+    type=click.INT,
+    help='Start index of file in collection to check'
+)
+@click.option(
+    '-e',
+    '--end',
+    type=click.INT,
+    help='End index of file in collection to check'
+)
+def check(config_file, log_file, uri_file, minted_nft_record_file, ledger, index_file, db, output, start, end) -> None:
+    logger = get_logger(__name__, log_file)
+    config = load_config(config_file)
+    configure_logging(config)
+    collection = config["collection"]
+    if not start:
+        start = config["start_idx"]
+    if not end:
+        end = config["end_idx"]
+    stores = {}
+    if uri_file:
+        stores["uris"] = load_uris(uri_file, collection)
+    if minted_nft_record_file:
+        stores["records"] = load_records(minted_nft_record_file)
+    if ledger:
+        account = XRPLAccount(config["xrpl_secret"], get_network_url(mode="devnet"))
+        stores["ledger"] = asyncio.run(load_ledger(account, config["collection_id"]))
+    if index_file:
+        with PinIndex(index_file) as pin_index:
+            stores["pins"] = pin_index.name_index(name_prefix=collection)
+    if db:
+        stores["db"] = load_db(config["heroku_db_url"], config["heroku_db_name"])
+    for store, data in stores.items():
+        logger.info(f"LOADED {store}: {len(data)} entries")
+    report = reconcile(collection, start, end, **stores)
+    for kind, count in report["counts"].items():
+        logger.error(f"{kind.upper()}: {count}")
+    with output.open("w", encoding="utf-8") as f:
+        logger.info(f"DUMP CHECK REPORT => {output}")
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    if report["ok"]:
+        logger.info(f"CHECK OK {start} to {end} across {', '.join(report['loaded'])}")
+    else:
+        sys.exit(1)
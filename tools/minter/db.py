@@ -1,9 +1,193 @@
+import io
+import sys
+import time
 import json
+import hashlib
 import psycopg2
+from functools import partial
+from psycopg2.extensions import quote_ident
 import click
 from pathlib import Path
-from typing import List, Dict
-from utils import load_config, get_logger
+from typing import Callable, Iterator, List, Dict, Tuple
+from utils import load_config, get_logger, configure_logging
+from records import RecordFile
+from tracing import span, configure_tracing, finish_tracing
+
+DEFAULT_CHUNK_SIZE = 10000
+COLUMNS = (
+    "id",
+    "tokenID",
+    "uri",
+    "background",
+    "pet",
+    "pot",
+    "eyes",
+    "neck",
+    "head",
+    "mask",
+    "clothes",
+)
+KEY_COLUMN = "tokenID"
+HASH_COLUMN = "content_hash"
+
+def record_entry(nft: Dict) -> Tuple:
+    return (
+        nft["id"],
+        nft["tokenID"],
+        nft["uri"],
+        nft["background"],
+        nft["pet"],
+        nft["pot"],
+        nft["eyes"],
+        nft["neck"],
+        nft["head"],
+        nft["mask"],
+        nft["clothes"]
+    )
+
+def iter_entries(minted_nft_record_file: Path, start: int, end: int) -> Iterator[Tuple]:
+    """Stream table rows for the index range from the minted record file"""
+    with RecordFile(minted_nft_record_file) as records:
+        for num, nft in records.items():
+            if start <= int(num) <= end:
+                yield record_entry(nft)
+
+def copy_value(value) -> str:
+    """Render a value in COPY text format"""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+def table_columns(conn, table: str, names: Tuple = COLUMNS) -> Tuple:
+    """Quoted identifiers of the table's columns matching names, ignoring case
+
+    Tables created without quoting hold tokenid rather than tokenID, so
+    the names are resolved against the table instead of being sent as is.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+    actual = {column[0].lower(): column[0] for column in cursor.description}
+    conn.commit()
+    missing = [name for name in names if name.lower() not in actual]
+    if missing:
+        raise ValueError(f"{table} has no column {', '.join(missing)}")
+    return tuple(quote_ident(actual[name.lower()], cursor) for name in names)
+
+def copy_chunk(cursor, table: str, entries: List[Tuple], columns: Tuple = COLUMNS) -> None:
+    buffer = io.StringIO()
+    for entry in entries:
+        buffer.write("\t".join(copy_value(value) for value in entry) + "\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+def content_hash(entry: Tuple) -> str:
+    return hashlib.sha256(json.dumps(entry, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+def _staging_table(table: str) -> str:
+    return table.split(".")[-1] + "_staging"
+
+def duplicate_keys(conn, table: str, key: str = KEY_COLUMN) -> List[Tuple[str, int]]:
+    """tokenIDs held by more than one row, which block the unique index"""
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {key}, count(*) FROM {table} "
+        f"GROUP BY {key} HAVING count(*) > 1 ORDER BY {key}"
+    )
+    duplicates = cursor.fetchall()
+    conn.commit()
+    return duplicates
+
+def prepare_upsert(conn, table: str, key: str = KEY_COLUMN) -> None:
+    """Add the hash column, the tokenID key and a per-session staging table"""
+    cursor = conn.cursor()
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {HASH_COLUMN} TEXT")
+    cursor.execute(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {table.split('.')[-1]}_{KEY_COLUMN}_key "
+        f"ON {table} ({key})"
+    )
+    cursor.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS {_staging_table(table)} "
+        f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+    )
+    conn.commit()
+
+def fetch_hashes(conn, table: str, key: str = KEY_COLUMN) -> Dict[str, str]:
+    """tokenID -> content hash of every row already in the table"""
+    cursor = conn.cursor(name="content_hashes")
+    cursor.itersize = 50000
+    cursor.execute(f"SELECT {key}, {HASH_COLUMN} FROM {table}")
+    hashes = dict(cursor)
+    cursor.close()
+    conn.commit()
+    return hashes
+
+def changed_entries(entries: Iterator[Tuple], hashes: Dict[str, str], counts: Dict[str, int]) -> Iterator[Tuple]:
+    """Rows whose content hash differs from the table's, with the hash appended"""
+    key = COLUMNS.index(KEY_COLUMN)
+    for entry in entries:
+        digest = content_hash(entry)
+        if hashes.get(entry[key]) == digest:
+            counts["unchanged"] += 1
+            continue
+        counts["changed"] += 1
+        yield entry + (digest,)
+
+def upsert_chunk(cursor, table: str, entries: List[Tuple], columns: Tuple = COLUMNS) -> None:
+    """Stage the chunk, then insert it, updating rows whose hash changed"""
+    staging = _staging_table(table)
+    key = columns[COLUMNS.index(KEY_COLUMN)]
+    columns = columns + (HASH_COLUMN,)
+    copy_chunk(cursor, staging, entries, columns)
+    names = ", ".join(columns)
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns if column != key)
+    cursor.execute(
+        f"INSERT INTO {table} AS target ({names}) SELECT {names} FROM {staging} "
+        f"ON CONFLICT ({key}) DO UPDATE SET {updates} "
+        f"WHERE target.{HASH_COLUMN} IS DISTINCT FROM EXCLUDED.{HASH_COLUMN}"
+    )
+
+def copy_entries(
+        conn,
+        table: str,
+        entries: Iterator[Tuple],
+        chunk_size: int,
+        logger,
+        load: Callable = copy_chunk,
+    ) -> int:
+    """Load rows into table chunk by chunk, committing after each chunk.
+
+    Each chunk is traced as db.chunk, its wait being the time spent
+    reading the chunk's rows from entries.
+    """
+    cursor = conn.cursor()
+    began = time.monotonic()
+    loaded = 0
+    chunk = []
+    reading = time.perf_counter()
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) < chunk_size:
+            continue
+        with span("db.chunk", reading, table=table, offset=loaded, rows=len(chunk)):
+            load(cursor, table, chunk)
+            conn.commit()
+        loaded += len(chunk)
+        chunk = []
+        logger.info(f"COPIED {loaded} rows, {loaded / max(time.monotonic() - began, 1e-9):.0f} rows/s")
+        reading = time.perf_counter()
+    if chunk:
+        with span("db.chunk", reading, table=table, offset=loaded, rows=len(chunk)):
+            load(cursor, table, chunk)
+            conn.commit()
+        loaded += len(chunk)
+    logger.info(f"COPIED {loaded} rows in {time.monotonic() - began:.1f}s")
+    return loaded
 
 @click.command(help="Upload minted NFT data to Postgres DB")
 @click.option(
@@ -39,14 +223,33 @@ from utils import load_config, get_logger
     type=click.INT,
     help='End index of file in collection to pin'
 )
+@click.option(
+    '--chunk_size',
+    default=DEFAULT_CHUNK_SIZE,
+    type=click.INT,
+    help='Rows per COPY, each chunk is committed on its own'
+)
+@click.option(
+    '-u',
+    '--upsert',
+    is_flag=True,
+    help='Insert new tokens and update changed ones, keyed on tokenID, sending only rows whose content hash differs'
+)
+@click.option(
+    '--trace_file',
+    type=Path,
+    help='Write per-chunk spans here as a Chrome trace and log a latency report'
+)
 @click.option(
     '-d',
     '--dry_run',
     is_flag=True,
 )
-def upload_to_db(config_file, log_file, minted_nft_record_file, start, end, dry_run) -> None:
+def upload_to_db(config_file, log_file, minted_nft_record_file, start, end, chunk_size, upsert, trace_file, dry_run) -> None:
     logger = get_logger(__name__, log_file)
     config = load_config(config_file)
+    configure_logging(config)
+    configure_tracing(trace_file)
     db_name = config["heroku_db_name"]
     db_url = config["heroku_db_url"]
     if not start:
@@ -56,43 +259,43 @@ def upload_to_db(config_file, log_file, minted_nft_record_file, start, end, dry_
     if dry_run:
         logger.info(f"Would process {start} to {end}")
         return None
-    minted = {}
-    with minted_nft_record_file.open("r") as f:
-        minted = json.load(f)
-    entries = []
-    logger.info(f"Preparing DB Entry Inputs")
-    for num in range(start, end+1):
-        nft = minted[str(num)]
-        entry = (
-            nft["id"],
-            nft["tokenID"],
-            nft["uri"],
-            nft["background"],
-            nft["pet"],
-            nft["pot"],
-            nft["eyes"],
-            nft["neck"],
-            nft["head"],
-            nft["mask"],
-            nft["clothes"]
-        )
-        logger.info(f"INPUT {entry}")
-        entries.append(entry)
+    conn = None
     try:
         logger.info("CONNECTING TO DB")
         conn = psycopg2.connect(db_url)
-        cursor = conn.cursor()
-        args = ','.join(
-                 cursor.mogrify(
-                     "(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)",
-                     entry
-                 ).decode('utf-8')
-                 for entry in entries
+        entries = iter_entries(minted_nft_record_file, start, end)
+        columns = table_columns(conn, db_name)
+        key = columns[COLUMNS.index(KEY_COLUMN)]
+        if upsert:
+            duplicates = duplicate_keys(conn, db_name, key)
+            if duplicates:
+                for token_id, count in duplicates[:20]:
+                    logger.error(f"DUPLICATE {KEY_COLUMN}[{token_id}] in {count} rows")
+                logger.error(
+                    f"{db_name} has {len(duplicates)} duplicated {KEY_COLUMN}s, "
+                    f"remove the extra rows before running --upsert"
                 )
-        logger.info("PUSHING TO DB")
-        cursor.execute(f"INSERT INTO {db_name} VALUES " + (args))
-        conn.commit()
+                sys.exit(1)
+            prepare_upsert(conn, db_name, key)
+            hashes = fetch_hashes(conn, db_name, key)
+            logger.info(f"FETCHED {len(hashes)} content hashes from {db_name}")
+            counts = {"changed": 0, "unchanged": 0}
+            logger.info(f"UPSERT {minted_nft_record_file} => {db_name}")
+            copy_entries(
+                conn,
+                db_name,
+                changed_entries(entries, hashes, counts),
+                chunk_size,
+                logger,
+                load=partial(upsert_chunk, columns=columns),
+            )
+            logger.info(f"UPSERTED {counts['changed']} changed, skipped {counts['unchanged']} unchanged")
+            return None
+        logger.info(f"COPY {minted_nft_record_file} => {db_name}")
+        copy_entries(conn, db_name, entries, chunk_size, logger, load=partial(copy_chunk, columns=columns))
     except Exception as e:
         logger.error(f"EXCEPTION ENCOUNTERED: {e}")
     finally:
-        conn.close()
+        if conn:
+            conn.close()
+        finish_tracing(logger, trace_file)
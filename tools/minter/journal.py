@@ -0,0 +1,98 @@
+import os
+import json
+from pathlib import Path
+from typing import Dict, List
+
+PREPARED = "P"
+SIGNED = "S"
+SUBMITTED = "U"
+VALIDATED = "V"
+FAILED = "F"
+IN_FLIGHT = (SIGNED, SUBMITTED)
+FIELDS = ("state", "index", "taxon", "sequence", "hash", "result", "last_ledger", "collection")
+
+def _collection_of(entry: Dict) -> int:
+    """Collection id of an entry, read from the taxon for lines written without one"""
+    if entry.get("collection") is not None:
+        return entry["collection"]
+    if entry.get("taxon") is None:
+        return None
+    # low 8 bits of the taxon, signed like encode_taxon packs them
+    coll_id = entry["taxon"] & 0xFF
+    return coll_id - (1 << 8) if coll_id & 0x80 else coll_id
+
+class MintJournal:
+    """ Append-only, fsync'd record of every mint state transition.
+
+    Each line is a compact JSON array in FIELDS order. Replaying the file
+    gives the latest state per index, which is what a re-run resumes from.
+    Entries are tagged with their collection id and a journal opened for
+    one collection ignores the others, so runs may share a file.
+    """
+
+    def __init__(self, path: Path, collection_id: int = None) -> None:
+        self.path = path
+        self.collection_id = collection_id
+        self.entries = self.replay(path, collection_id)
+        self.f = path.open("ab")
+        if self.f.tell() and not self._ends_with_newline():
+            self.f.write(b"\n")
+
+    def _ends_with_newline(self) -> bool:
+        with self.path.open("rb") as f:
+            f.seek(-1, 2)
+            return f.read(1) == b"\n"
+
+    @staticmethod
+    def replay(path: Path, collection_id: int = None) -> Dict[int, Dict]:
+        entries = {}
+        if not path.exists():
+            return entries
+        with path.open("rb") as f:
+            for line in f:
+                try:
+                    entry = dict(zip(FIELDS, json.loads(line)))
+                except ValueError:
+                    # torn write from a crash, the state before it stands
+                    continue
+                if collection_id is not None and _collection_of(entry) != collection_id:
+                    continue
+                entries[entry["index"]] = entry
+        return entries
+
+    def record(
+        self,
+        state: str,
+        index: int,
+        taxon: int = None,
+        sequence: int = None,
+        tx_hash: str = None,
+        result: str = None,
+        last_ledger: int = None,
+    ) -> None:
+        previous = {} if state == PREPARED else self.entries.get(index, {})
+        entry = {
+            "state": state,
+            "index": index,
+            "taxon": taxon if taxon is not None else previous.get("taxon"),
+            "sequence": sequence if sequence is not None else previous.get("sequence"),
+            "hash": tx_hash if tx_hash is not None else previous.get("hash"),
+            "result": result,
+            "last_ledger": last_ledger if last_ledger is not None else previous.get("last_ledger"),
+            "collection": self.collection_id,
+        }
+        line = json.dumps([entry[field] for field in FIELDS], separators=(",", ":"))
+        self.f.write(line.encode("utf-8") + b"\n")
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.entries[index] = entry
+
+    def is_minted(self, index: int) -> bool:
+        entry = self.entries.get(index)
+        return entry is not None and entry["state"] == VALIDATED
+
+    def in_flight(self) -> List[Dict]:
+        return [e for e in self.entries.values() if e["state"] in IN_FLIGHT]
+
+    def close(self) -> None:
+        self.f.close()
@@ -5,17 +5,30 @@ from context import (
     get_network_url,
 )
 import click
-import time
 import asyncio
 import json
 import bitstring
-from ipfs import IPFSRepo, IPFSFile
+from ipfs import AsyncIPFSRepo
+from bundle import MetadataBundle
+from cid import file_cids
+from journal import MintJournal, PREPARED, SIGNED, SUBMITTED, VALIDATED, FAILED
+from retry import retry_async, configure_retry, log_retry_stats
+from tracing import span, configure_tracing, finish_tracing
+from pin_index import PinIndex, DEFAULT_INDEX_FILE
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from xrpl.utils import hex_to_str
-from xrpl.models.response import ResponseStatus
+from xrpl.utils import hex_to_str, str_to_hex
 from xrpl.models.transactions import NFTokenMintFlag
-from typing import List, Dict
-from utils import load_config, update_json_with_url, get_logger
+from xrpl.asyncio.clients import AsyncWebsocketClient
+from xrpl.asyncio.ledger import get_latest_validated_ledger_sequence
+from xrpl.asyncio.transaction import get_transaction_from_hash, XRPLReliableSubmissionException
+from xrpl.asyncio.clients.exceptions import XRPLRequestFailureException
+from typing import List, Dict, Set, Tuple
+from records import RecordWriter, RecordFile
+from utils import load_config, get_logger, configure_logging
+
+_LEDGER_CLOSE_TIME = 4
 
 def encode_taxon(index: int, coll_id: int) -> int:
     """[24 bits] = INDEX + [8 bits] = COLLECTION ID"""
@@ -24,48 +37,177 @@ def encode_taxon(index: int, coll_id: int) -> int:
 
 def decode_taxon(packed: int) -> List:
     """unpacked[0] = INDEX, unpacked[1] = COLLECTION ID"""
-    pint = bitstring.pack(f"int:32={packed}")
-    unpacked = pint.readlist("int:24, int:8")
-    return unpacked
+    packed &= 0xFFFFFFFF
+    index = packed >> 8
+    coll_id = packed & 0xFF
+    if index & 0x800000:
+        index -= 1 << 24
+    if coll_id & 0x80:
+        coll_id -= 1 << 8
+    return [index, coll_id]
 
-def get_ipfs_file_info(repo: IPFSRepo, file_name: str) -> Dict:
-    response = None
-    retries = 3
-    while not response and retries != 0:
-        response = repo.get(file_name)
-        time.sleep(2)
-        if "rows" in response:
-            break
-        retries -= 1
-    if not response or "rows" not in response:
-        return None
-    return response
+async def get_ipfs_uri_list(
+    config: Dict,
+    repo: AsyncIPFSRepo,
+    start: int,
+    end: int,
+    uri_record_file: Path,
+    logger,
+    index: PinIndex = None,
+) -> Dict[str, str]:
+    uris = {}
+    collection = config["collection"]
+    try:
+        async with repo:
+            with span("uris.sweep", collection=collection) as tags:
+                if index:
+                    synced = await index.sync_async(repo)
+                    logger.info(f"SYNC {index.path} +{synced['pinned']} -{synced['unpinned']}")
+                    pins = index.name_index(name_prefix=collection)
+                else:
+                    logger.info(f"SWEEP pin list [{collection}*]")
+                    pins = await repo.name_index(name_prefix=collection)
+                tags["pins"] = len(pins)
+        logger.info(f"SWEEP found {len(pins)} pins")
+        with RecordWriter(uri_record_file) as records:
+            logger.info(f"APPEND URIS => {uri_record_file}")
+            for image_num in range(start, end+1):
+                image_json_name = collection + str(image_num) + ".json"
+                if image_json_name not in pins:
+                    logger.error(f"MISSING PIN [{image_json_name}]")
+                    continue
+                uris[image_json_name] = "ipfs://" + pins[image_json_name]
+                records.write(image_json_name, uris[image_json_name])
+    except Exception as e:
+        logger.error(f"EXCEPTION ENCOUNTERED: {e}")
+    return uris
 
-def get_ipfs_uri_list(
+def get_dir_uri_list(
     config: Dict,
-    repo: IPFSRepo,
+    dir_pins_file: Path,
     start: int,
     end: int,
     uri_record_file: Path,
     logger
 ) -> Dict[str, str]:
+    """Derive ipfs://<dirCID>/<name> URIs from a directory pin record"""
+    collection = config["collection"]
+    with dir_pins_file.open("r") as f:
+        chunks = json.load(f)["json"]
     uris = {}
+    with RecordWriter(uri_record_file) as records:
+        logger.info(f"APPEND URIS => {uri_record_file}")
+        for chunk in chunks:
+            for image_num in range(max(start, chunk["start"]), min(end, chunk["end"])+1):
+                image_json_name = collection + str(image_num) + ".json"
+                uris[image_json_name] = f"ipfs://{chunk['cid']}/{image_json_name}"
+                records.write(image_json_name, uris[image_json_name])
+    missing = (end - start + 1) - len(uris)
+    if missing:
+        logger.error(f"MISSING {missing} URIS in {dir_pins_file}")
+    return uris
+
+def get_local_uri_list(
+    config: Dict,
+    meta_json_dir: Path,
+    start: int,
+    end: int,
+    uri_record_file: Path,
+    logger
+) -> Dict[str, str]:
+    """Derive URIs by computing each pinned JSON file's CID locally"""
     collection = config["collection"]
+    names = [collection + str(image_num) + ".json" for image_num in range(start, end+1)]
+    paths = [meta_json_dir / name for name in names if (meta_json_dir / name).exists()]
+    if len(paths) != len(names):
+        logger.error(f"MISSING {len(names) - len(paths)} JSON files in {meta_json_dir}")
+    with span("uris.cids", collection=collection, files=len(paths)):
+        cids = file_cids(paths)
+    uris = {path.name: "ipfs://" + cids[path] for path in paths}
+    with RecordWriter(uri_record_file) as records:
+        logger.info(f"APPEND URIS => {uri_record_file}")
+        for name, uri in uris.items():
+            records.write(name, uri)
+    return uris
+
+async def reconnect(client: AsyncWebsocketClient, logger) -> None:
+    """Replace the client's websocket so a retried request never reuses a broken connection"""
+    logger.info(f"RECONNECT {client.url}")
     try:
-        for image_num in range(start, end+1):
-            image_json_name = collection + str(image_num) + ".json"
-            logger.info(f"GET [{image_json_name}]")
-            info = get_ipfs_file_info(repo, image_json_name)
-            fileuri = "ipfs://" + info["rows"][0]["ipfs_pin_hash"]
-            logger.info(f"URI [{image_json_name}] = {fileuri}")
-            uris[image_json_name] = fileuri
+        await client.close()
     except Exception as e:
-        logger.error(f"EXCEPTION ENCOUNTERED: {e}")
-    finally:
-        with uri_record_file.open("w", encoding="utf-8") as f:
-            logger.info(f"DUMP URIS => {uri_record_file}")
-            json.dump(uris, f, ensure_ascii=False, indent=4)
-        return uris
+        logger.warning(f"RECONNECT close failed: {e}")
+    await client.open()
+
+async def settle_in_flight(journal: MintJournal, client: AsyncWebsocketClient, logger) -> None:
+    """Resolve mints that were signed or submitted when the last run stopped"""
+    for entry in journal.in_flight():
+        index = entry["index"]
+        logger.info(f"RECHECK[{index}] {entry['hash']}")
+        while True:
+            try:
+                response = await retry_async(
+                                    "xrpl.tx",
+                                    get_transaction_from_hash,
+                                    entry["hash"],
+                                    client,
+                                    logger=logger,
+                                    on_retry=partial(reconnect, client, logger),
+                                )
+            except XRPLRequestFailureException as e:
+                # signed but never submitted, or not in a ledger yet
+                if e.error != "txnNotFound":
+                    raise
+                response = None
+            if response is not None and response.is_successful() and response.result.get("validated"):
+                result = response.result
+                tx_result = result["meta"]["TransactionResult"]
+                state = VALIDATED if tx_result == "tesSUCCESS" else FAILED
+                journal.record(state, index, result=tx_result)
+                break
+            latest = await retry_async(
+                            "xrpl.ledger",
+                            get_latest_validated_ledger_sequence,
+                            client,
+                            logger=logger,
+                            on_retry=partial(reconnect, client, logger),
+                        )
+            if entry["last_ledger"] is None or latest > entry["last_ledger"]:
+                journal.record(FAILED, index, result="expired")
+                break
+            await asyncio.sleep(_LEDGER_CLOSE_TIME)
+        logger.info(f"RECHECKED[{index}] {journal.entries[index]['result']}")
+
+async def get_issued_set(account: XRPLAccount, issuer: str) -> Set[Tuple[int, str]]:
+    """(taxon, hex URI) of every NFT from issuer still held by the account"""
+    issued = set()
+    async for nft in account.iter_nfts():
+        if nft["Issuer"] == issuer:
+            issued.add((nft["NFTokenTaxon"], nft["URI"].upper()))
+    return issued
+
+async def plan_mints(
+    config: Dict,
+    account: XRPLAccount,
+    issuer: str,
+    start: int,
+    end: int,
+    nft_uris: Dict[str, str],
+    logger,
+) -> List[int]:
+    """Indices in the range whose (taxon, URI) is not already on the ledger"""
+    collection = config["collection"]
+    collection_id = config["collection_id"]
+    issued = await get_issued_set(account, issuer)
+    pending = []
+    for image_num in range(start, end+1):
+        image_json_name = collection + str(image_num) + ".json"
+        taxon = encode_taxon(image_num, collection_id) & 0xFFFFFFFF
+        uri = str_to_hex(nft_uris[image_json_name]).upper()
+        if (taxon, uri) not in issued:
+            pending.append(image_num)
+    logger.info(f"DEDUP {end-start+1-len(pending)} already minted, {len(pending)} to mint")
+    return pending
 
 async def mint_nft_collection(
     config: Dict,
@@ -76,83 +218,209 @@ async def mint_nft_collection(
     start: int,
     end: int,
     nft_uris: Dict[str, str],
+    journal: MintJournal,
     logger,
+    dedup: bool = True,
 ) -> None:
-    minted = {}
     wallet = account.get_wallet()
     collection = config["collection"]
     collection_id = config["collection_id"]
     transfer_fee = config["transfer_fee"]
     try:
-        for image_num in range(start, end+1):
-            image_json_name = collection + str(image_num) + ".json"
-            taxon = encode_taxon(image_num, collection_id)
-            logger.info(f"MINT[{image_json_name}, {nft_uris[image_json_name]}, {taxon}]")
-            nft = XRPLNFT(
-                issuer=issuer,
-                uri=nft_uris[image_json_name],
-                network_url=network_url,
-            )
-            nft.prepare_mint_tx(
-                taxon=taxon,
-                flags=flags,
-                transfer_fee=transfer_fee,
-            )
-            mint_response = await nft.mint(wallet)
-            logger.info(f"RESULT {mint_response}")
+        async with AsyncWebsocketClient(network_url) as client:
+            reopen = partial(reconnect, client, logger)
+            with span("mint.settle", collection=collection):
+                await settle_in_flight(journal, client, logger)
+            if dedup:
+                with span("mint.dedup", collection=collection):
+                    indices = await plan_mints(config, account, issuer, start, end, nft_uris, logger)
+            else:
+                indices = range(start, end+1)
+            for image_num in indices:
+                if journal.is_minted(image_num):
+                    continue
+                image_json_name = collection + str(image_num) + ".json"
+                taxon = encode_taxon(image_num, collection_id)
+                logger.info(f"MINT[{image_json_name}, {nft_uris[image_json_name]}, {taxon}]")
+                with span("mint.prepare", collection=collection, index=image_num):
+                    nft = XRPLNFT(
+                        issuer=issuer,
+                        uri=nft_uris[image_json_name],
+                        network_url=network_url,
+                    )
+                    nft.prepare_mint_tx(
+                        taxon=taxon,
+                        flags=flags,
+                        transfer_fee=transfer_fee,
+                    )
+                    journal.record(PREPARED, image_num, taxon=taxon)
+                with span("mint.sign", collection=collection, index=image_num):
+                    tx_hash = await retry_async(
+                                        "xrpl.sign",
+                                        nft.sign_mint_tx,
+                                        wallet,
+                                        client,
+                                        logger=logger,
+                                        on_retry=reopen,
+                                    )
+                journal.record(
+                    SIGNED,
+                    image_num,
+                    sequence=nft.sequence,
+                    tx_hash=tx_hash,
+                    last_ledger=nft.max_ledger,
+                )
+                # resubmitting the same signed blob cannot double mint
+                with span("mint.submit", collection=collection, index=image_num) as tags:
+                    try:
+                        mint_response = await retry_async(
+                                            "xrpl.submit",
+                                            nft.submit_mint_tx,
+                                            client,
+                                            logger=logger,
+                                            on_retry=reopen,
+                                        )
+                        tx_result = nft.mint_response.result.get("meta", {}).get("TransactionResult")
+                    except XRPLReliableSubmissionException as e:
+                        # its LastLedgerSequence passed, the blob can never apply
+                        mint_response = e
+                        tx_result = "expired"
+                    except XRPLRequestFailureException as e:
+                        # outcome unknown, the next run rechecks the hash
+                        logger.error(f"UNSETTLED[{image_json_name}] {e.error}, left in flight")
+                        tx_result = None
+                    finally:
+                        journal.record(SUBMITTED, image_num)
+                    tags["result"] = tx_result
+                if tx_result is None:
+                    continue
+                if tx_result == "tesSUCCESS":
+                    journal.record(VALIDATED, image_num, result=tx_result)
+                else:
+                    journal.record(FAILED, image_num, result=tx_result)
+                logger.info(f"RESULT {mint_response} {tx_result}")
     except Exception as e:
         logger.error(f"EXCEPTION ENCOUNTERED: {e}")
+    finally:
+        journal.close()
 
 
+def load_metadata(metadata_file: Path) -> Dict:
+    if not metadata_file.exists():
+        return None
+    with metadata_file.open("r") as f:
+        return json.load(f)
+
+def build_token_index(
+    config: Dict,
+    nft_uris: Dict[str, str],
+    meta_json_dir: Path,
+    start: int,
+    end: int,
+    bundle: MetadataBundle = None,
+    workers: int = 16,
+) -> Dict[int, Dict]:
+    """Map each collection index to its name, expected URI and metadata.
+
+    Metadata comes from the bundle when one is given, otherwise from the
+    per-token files in meta_json_dir.
+    """
+    collection = config["collection"]
+    index = {}
+    for image_num in range(start, end+1):
+        image_json_name = collection + str(image_num) + ".json"
+        index[image_num] = {
+            "name": image_json_name,
+            "uri": nft_uris.get(image_json_name),
+        }
+    if bundle:
+        for image_num in index:
+            index[image_num]["metadata"] = bundle.get(image_num)
+        return index
+    files = [meta_json_dir / entry["name"] for entry in index.values()]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for image_num, metadata in zip(index, pool.map(load_metadata, files)):
+            index[image_num]["metadata"] = metadata
+    return index
+
 async def get_mint_records(
     config: Dict,
     account: XRPLAccount,
     nft_uris: Dict[str, str],
     minted_record_file: Path,
+    report_file: Path,
     meta_json_dir: Path,
-    num_records: int,
+    start: int,
+    end: int,
     logger,
-) -> None:
-    collection = config["collection"]
-    minted = {}
+    bundle: MetadataBundle = None,
+) -> Dict:
+    collection_id = config["collection_id"]
+    report = {
+        "matched": 0,
+        "mismatched": [],
+        "missing": [],
+        "duplicates": [],
+        "unknown": [],
+        "no_metadata": [],
+    }
+    seen = set()
     try:
-        nft_list = []
-        #marker = None
-        while len(nft_list) < num_records:
-            #get_nfts = await account.get_nfts(limit=num_records, marker=marker)
-            get_nfts = await account.get_nfts(limit=num_records)
-            nft_list += get_nfts.result["account_nfts"]
-            #marker = get_nfts.result["marker"]
-            logger.info(f"GET_NFTS => {len(nft_list)}")
-        for nft in nft_list:
-            taxon = nft["NFTokenTaxon"]
-            tokenID = nft["NFTokenID"]
-            uri = nft["URI"]
-            decoded = decode_taxon(taxon)
-            image_num = decoded[0]
-            logger.info(f"PROCESSING {image_num}")
-            image_json_name = collection + str(image_num) + ".json"
-            if nft_uris[image_json_name] == hex_to_str(uri):
-                logger.info(f"VALIDATED URI {nft_uris[image_json_name]}")
-            else:
-                logger.error("MISMATCH URI {nft_uris[image_json_name]} != {hex_to_str(uri)}")
-            metadata_file = meta_json_dir / image_json_name
-            metadata = {}
-            with metadata_file.open("r") as f:
-                metadata = json.load(f)
-            metadata["name"] = image_json_name
-            metadata["tokenID"] = tokenID
-            metadata["uri"] = nft_uris[image_json_name]
-            minted[image_num] = metadata
-        logger.info(f"Number of nfts processed: {len(nft_list)}")
+        logger.info(f"INDEXING {start} to {end}")
+        with span("mints.index", collection=config["collection"], tokens=end-start+1):
+            index = build_token_index(config, nft_uris, meta_json_dir, start, end, bundle)
+        with RecordWriter(minted_record_file) as minted:
+            logger.info(f"APPEND MINTED DETAILS => {minted_record_file}")
+            with span("mints.scan", collection=config["collection"]):
+                async for nft in account.iter_nfts():
+                    if nft["Issuer"] != account.address:
+                        continue
+                    image_num, coll_id = decode_taxon(nft["NFTokenTaxon"])
+                    if coll_id != collection_id:
+                        continue
+                    tokenID = nft["NFTokenID"]
+                    entry = index.get(image_num)
+                    if entry is None:
+                        report["unknown"].append({"index": image_num, "tokenID": tokenID})
+                        continue
+                    if image_num in seen:
+                        report["duplicates"].append({"index": image_num, "tokenID": tokenID})
+                        continue
+                    seen.add(image_num)
+                    uri = hex_to_str(nft["URI"])
+                    if entry["uri"] != uri:
+                        report["mismatched"].append({
+                            "index": image_num,
+                            "tokenID": tokenID,
+                            "expected": entry["uri"],
+                            "actual": uri,
+                        })
+                        continue
+                    report["matched"] += 1
+                    metadata = entry["metadata"]
+                    if metadata is None:
+                        report["no_metadata"].append(image_num)
+                        continue
+                    metadata["name"] = entry["name"]
+                    metadata["tokenID"] = tokenID
+                    metadata["uri"] = uri
+                    minted.write(image_num, metadata)
     except Exception as e:
         logger.error(f"EXCEPTION ENCOUNTERED: {e}")
+        report["error"] = str(e)
     finally:
-        if not minted_record_file.exists():
-            minted_record_file.touch()
-        with minted_record_file.open("r+", encoding="utf-8") as f:
-            logger.info(f"DUMP MINTED DETAILS => {minted_record_file}")
-            json.dump(minted, f, ensure_ascii=False, indent=4, sort_keys=True)
+        report["missing"] = [num for num in range(start, end+1) if num not in seen]
+        logger.info(
+            f"RECONCILED matched={report['matched']} "
+            f"mismatched={len(report['mismatched'])} "
+            f"missing={len(report['missing'])} "
+            f"duplicates={len(report['duplicates'])} "
+            f"unknown={len(report['unknown'])}"
+        )
+        with report_file.open("w", encoding="utf-8") as f:
+            logger.info(f"DUMP RECONCILE REPORT => {report_file}")
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        return report
 
 
 @click.command(help="Mint NFT collections on XRPL")
@@ -180,6 +448,40 @@ async def get_mint_records(
     '--get_mints',
     is_flag=True,
 )
+@click.option(
+    '--offline',
+    is_flag=True,
+    help='With --create_uris, compute URIs from local JSON files instead of the pin list'
+)
+@click.option(
+    '--dir_pins_file',
+    type=Path,
+    help='Directory pin record from ipfs pin --dir_mode to derive URIs from offline'
+)
+@click.option(
+    '-b',
+    '--bundle_file',
+    type=Path,
+    help='Metadata bundle to read token metadata from instead of json_dir'
+)
+@click.option(
+    '-j',
+    '--journal_file',
+    type=Path,
+    help='Append-only journal of mint progress used to resume interrupted runs, '
+         'mint-journal-<collection>-<network>.log by default'
+)
+@click.option(
+    '--index_file',
+    default=DEFAULT_INDEX_FILE,
+    type=Path,
+    help='Local pin index shared with the ipfs tools, synced before deriving URIs'
+)
+@click.option(
+    '--dedup/--no_dedup',
+    default=True,
+    help='Skip indices whose taxon and URI are already held by the issuer'
+)
 @click.option(
     '-s',
     '--start',
@@ -192,25 +494,35 @@ async def get_mint_records(
     type=click.INT,
     help='End index of file in collection to pin'
 )
+@click.option(
+    '--trace_file',
+    type=Path,
+    help='Write stage spans here as a Chrome trace and log a latency report'
+)
 @click.option(
     '-d',
     '--dry_run',
     is_flag=True,
 )
-def mint_nfts(config_file, log_file, create_uris, get_mints, start, end, dry_run) -> None:
+def mint_nfts(config_file, log_file, create_uris, get_mints, offline, dir_pins_file, bundle_file, journal_file, index_file, dedup, start, end, trace_file, dry_run) -> None:
     logger = get_logger(__name__, log_file)
     config = load_config(config_file)
-    ipfs_repo = IPFSRepo(
+    configure_logging(config)
+    configure_retry(config)
+    configure_tracing(trace_file)
+    ipfs_repo = AsyncIPFSRepo(
                     api_key=config["pinata_api_key"],
                     api_secret=config["pinata_api_secret"],
                 )
     xrpl_account = config["xrpl_account"]
     xrpl_secret = config["xrpl_secret"]
     transfer_fee = config["transfer_fee"]
-    network_url = get_network_url(mode="devnet")
+    network = "devnet"
+    network_url = get_network_url(mode=network)
     acc = XRPLAccount(xrpl_secret, network_url)
-    uri_records_file = Path("uris.json")
-    minted_records_file = Path("minted-carscan.json")
+    uri_records_file = Path("uris.ndjson")
+    minted_records_file = Path("minted-carscan.ndjson")
+    reconcile_report_file = Path("reconcile-report.json")
     meta_json_dir = Path(config["json_dir"])
     if not start:
         start = config["start_idx"]
@@ -219,31 +531,63 @@ def mint_nfts(config_file, log_file, create_uris, get_mints, start, end, dry_run
     if dry_run:
         logger.info(f"Would process {start} to {end}")
         return None
+    if (create_uris and offline):
+        get_local_uri_list(
+            config,
+            meta_json_dir,
+            start,
+            end,
+            uri_records_file,
+            logger
+        )
+        finish_tracing(logger, trace_file)
+        return None
+    if (create_uris and dir_pins_file):
+        get_dir_uri_list(
+            config,
+            dir_pins_file,
+            start,
+            end,
+            uri_records_file,
+            logger
+        )
+        finish_tracing(logger, trace_file)
+        return None
     if (create_uris):
-        uris = get_ipfs_uri_list(
-                    config,
-                    ipfs_repo,
-                    start,
-                    end,
-                    uri_records_file,
-                    logger
-                )
+        uris = asyncio.run(
+            get_ipfs_uri_list(
+                config,
+                ipfs_repo,
+                start,
+                end,
+                uri_records_file,
+                logger,
+                PinIndex(index_file)
+            )
+        )
+        finish_tracing(logger, trace_file)
         return None
     else:
-        with uri_records_file.open("r") as f:
-            uris = json.load(f)
+        uris = RecordFile(uri_records_file)
     if (get_mints):
+        bundle = MetadataBundle(bundle_file) if bundle_file else None
         asyncio.run(
             get_mint_records(
                 config=config,
                 account=acc,
                 nft_uris=uris,
                 minted_record_file=minted_records_file,
+                report_file=reconcile_report_file,
                 meta_json_dir=meta_json_dir,
-                num_records=(end-start+1),
-                logger=logger
+                start=start,
+                end=end,
+                logger=logger,
+                bundle=bundle
             )
         )
+        if bundle:
+            bundle.close()
+        finish_tracing(logger, trace_file)
         return None
     asyncio.run(
         mint_nft_collection(
@@ -255,7 +599,13 @@ def mint_nfts(config_file, log_file, create_uris, get_mints, start, end, dry_run
             start=start,
             end=end,
             nft_uris=uris,
-            logger=logger
+            journal=MintJournal(
+                journal_file or Path(f"mint-journal-{config['collection']}-{network}.log"),
+                config["collection_id"],
+            ),
+            logger=logger,
+            dedup=dedup
         )
     )
-
+    log_retry_stats(logger)
+    finish_tracing(logger, trace_file)
@@ -2,6 +2,12 @@
 import click
 from mint_nft import mint_nfts
 from db import upload_to_db
+from trait_db import upload_traits
+from rarity import rank_rarity
+from check import check
+from records import compact_records
+from tx_export import export_txs
+from bundle import bundle_metadata
 
 @click.group()
 def main():
@@ -9,6 +15,12 @@ def main():
 
 main.add_command(mint_nfts)
 main.add_command(upload_to_db)
+main.add_command(upload_traits)
+main.add_command(rank_rarity)
+main.add_command(check)
+main.add_command(compact_records)
+main.add_command(export_txs)
+main.add_command(bundle_metadata)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import click
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+from utils import load_config, get_logger, configure_logging
+from records import RecordWriter, RecordFile
+from trait_db import extract_traits
+
+# value used for a trait a token does not have, so absence counts as a trait
+MISSING_TRAIT = "None"
+
+class TraitMatrix:
+    """ Columnar trait table: one int32 code column per trait type
+
+    values[type][code] is the trait value a code stands for. Missing traits
+    get their own MISSING_TRAIT code, so every row has a value in every column.
+    """
+
+    def __init__(self, indices: List[int], trait_types: List[str], codes: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+        self.indices = indices
+        self.trait_types = trait_types
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def build(cls, records: Iterator[Tuple[int, Dict[str, str]]]) -> "TraitMatrix":
+        indices = []
+        rows = []
+        for index, traits in records:
+            indices.append(index)
+            rows.append(traits)
+        trait_types = sorted(set(trait_type for traits in rows for trait_type in traits))
+        codes = np.zeros((len(rows), len(trait_types)), dtype=np.int32)
+        values = {}
+        for column, trait_type in enumerate(trait_types):
+            raw = np.array([traits.get(trait_type, MISSING_TRAIT) for traits in rows], dtype=object)
+            values[trait_type], codes[:, column] = np.unique(raw, return_inverse=True)
+        return cls(indices, trait_types, codes, values)
+
+    def frequencies(self) -> np.ndarray:
+        """Frequency of each token's value in each column, shaped like codes"""
+        freqs = np.empty(self.codes.shape, dtype=np.float64)
+        total = max(len(self.indices), 1)
+        for column in range(len(self.trait_types)):
+            counts = np.bincount(self.codes[:, column])
+            freqs[:, column] = counts[self.codes[:, column]] / total
+        return freqs
+
+    def trait_counts(self) -> Dict[str, Dict[str, int]]:
+        return {
+            trait_type: dict(zip(
+                self.values[trait_type].tolist(),
+                np.bincount(self.codes[:, column]).tolist(),
+            ))
+            for column, trait_type in enumerate(self.trait_types)
+        }
+
+def rank_desc(scores: np.ndarray) -> np.ndarray:
+    """1-based competition rank, highest score first, ties share the best rank"""
+    order = np.argsort(-scores, kind="stable")
+    sorted_scores = scores[order]
+    first = np.r_[True, sorted_scores[1:] != sorted_scores[:-1]]
+    positions = np.arange(1, len(scores) + 1)
+    ranks = np.empty(len(scores), dtype=np.int64)
+    ranks[order] = np.maximum.accumulate(np.where(first, positions, 0))
+    return ranks
+
+def compute_rarity(matrix: TraitMatrix) -> Dict[int, Dict]:
+    """Statistical rarity (product of trait frequencies), rarity score
+    (sum of inverse frequencies) and rank by score for every token"""
+    freqs = matrix.frequencies()
+    if freqs.shape[1]:
+        statistical = np.exp(np.log(freqs).sum(axis=1))
+        scores = (1.0 / freqs).sum(axis=1)
+    else:
+        statistical = np.ones(len(matrix.indices))
+        scores = np.zeros(len(matrix.indices))
+    ranks = rank_desc(scores)
+    return {
+        index: {
+            "rarity_score": float(score),
+            "statistical_rarity": float(prob),
+            "rarity_rank": int(rank),
+        }
+        for index, score, prob, rank in zip(matrix.indices, scores, statistical, ranks)
+    }
+
+def iter_record_traits(minted_nft_record_file: Path) -> Iterator[Tuple[int, Dict[str, str]]]:
+    with RecordFile(minted_nft_record_file) as records:
+        for num, record in records.items():
+            yield int(num), extract_traits(record)
+
+def iter_json_dir_traits(json_dir: Path, collection: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    pattern = re.compile(re.escape(collection) + r"(\d+)\.json$")
+    with os.scandir(json_dir) as entries:
+        for entry in entries:
+            match = pattern.match(entry.name)
+            if match and entry.is_file():
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    yield int(match.group(1)), extract_traits(json.load(f))
+
+def write_back(minted_nft_record_file: Path, rarity: Dict[int, Dict]) -> int:
+    """Append minted records updated with their rarity fields"""
+    updated = 0
+    with RecordFile(minted_nft_record_file) as records, RecordWriter(minted_nft_record_file) as writer:
+        for num, record in records.items():
+            if int(num) in rarity:
+                record.update(rarity[int(num)])
+                writer.write(num, record)
+                updated += 1
+    return updated
+
+@click.command(help="Rank collection rarity from minted records or metadata files")
+@click.option(
+    '-c',
+    '--config_file',
+    required=True,
+    type=Path,
+    help='Config file with secrets and details about collection to mint'
+)
+@click.option(
+    '-l',
+    '--log_file',
+    default="minter.log",
+    type=click.STRING,
+    help='Logfile to record runtime info'
+)
+@click.option(
+    '-m',
+    '--minted_nft_record_file',
+    type=Path,
+    help='Minted nft records to rank, rarity fields are written back into them'
+)
+@click.option(
+    '-j',
+    '--json_dir',
+    type=Path,
+    help='Rank the metadata files in this directory instead of minted records'
+)
+@click.option(
+    '-o',
+    '--output',
+    default="rarity.json",
+    type=Path,
+    help='File to write rarity by index and per-trait counts to'
+)
+@click.option(
+    '-d',
+    '--dry_run',
+    is_flag=True,
+)
+def rank_rarity(config_file, log_file, minted_nft_record_file, json_dir, output, dry_run) -> None:
+    logger = get_logger(__name__, log_file)
+    config = load_config(config_file)
+    configure_logging(config)
+    if minted_nft_record_file:
+        records = iter_record_traits(minted_nft_record_file)
+    else:
+        json_dir = json_dir or Path(config["json_dir"])
+        records = iter_json_dir_traits(json_dir, config["collection"])
+    matrix = TraitMatrix.build(records)
+    logger.info(f"MATRIX {len(matrix.indices)} tokens x {len(matrix.trait_types)} trait types")
+    rarity = compute_rarity(matrix)
+    if dry_run:
+        logger.info(f"Would write rarity for {len(rarity)} tokens to {output}")
+        return None
+    with output.open("w", encoding="utf-8") as f:
+        logger.info(f"DUMP RARITY => {output}")
+        json.dump(
+            {
+                "traits": matrix.trait_counts(),
+                "tokens": {str(index): rarity[index] for index in sorted(rarity)},
+            },
+            f,
+            ensure_ascii=False,
+            indent=4,
+        )
+    if minted_nft_record_file:
+        updated = write_back(minted_nft_record_file, rarity)
+        logger.info(f"UPDATED {updated} records in {minted_nft_record_file}")
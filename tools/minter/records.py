@@ -0,0 +1,217 @@
+import os
+import json
+import click
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Iterator, Tuple
+from utils import get_logger, iter_json_object
+
+INDEX_SUFFIX = ".idx"
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+def _encode(key: str, value: Any) -> bytes:
+    return (json.dumps([key, value], ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+def _trim_partial_line(path: Path) -> None:
+    """Drop a trailing record cut short by a crash mid-append"""
+    with path.open("rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return None
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return None
+        step = min(size, 65536)
+        pos = size
+        while pos > 0:
+            pos = max(0, pos - step)
+            f.seek(pos)
+            newline = f.read(size - pos).rfind(b"\n")
+            if newline >= 0:
+                f.truncate(pos + newline + 1)
+                return None
+        f.truncate(0)
+
+class RecordWriter:
+    """ Appends keyed records to an NDJSON file and its sidecar offset index
+
+    Each line is a compact [key, value] array; the sidecar gets a
+    [key, offset, length] line per record. Re-writing a key appends a new
+    version, and readers only see the latest one.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.count = 0
+
+    def __enter__(self):
+        if self.path.exists():
+            _trim_partial_line(self.path)
+            # bring the sidecar up to date before appending after it
+            RecordFile(self.path).close()
+        self.f = self.path.open("ab")
+        self.idx = index_path(self.path).open("a", encoding="utf-8")
+        return self
+
+    def write(self, key, value) -> None:
+        line = _encode(str(key), value)
+        offset = self.f.tell()
+        self.f.write(line)
+        self.idx.write(json.dumps([str(key), offset, len(line)], ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def flush(self) -> None:
+        self.f.flush()
+        self.idx.flush()
+
+    def __exit__(self, *exc) -> None:
+        self.f.close()
+        self.idx.close()
+
+class RecordFile(Mapping):
+    """ Read-only view of an NDJSON record file, keyed like a dict
+
+    Opening reads only the sidecar index (rebuilding or extending it from
+    the data file when it is missing or behind), then each lookup seeks
+    straight to its record.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.offsets = {}
+        self.f = self.path.open("rb")
+        self._load_index()
+
+    def _load_index(self) -> None:
+        size = self.size = os.fstat(self.f.fileno()).st_size
+        end = 0
+        stale = False
+        sidecar = index_path(self.path)
+        if sidecar.exists():
+            with sidecar.open("r", encoding="utf-8") as idx:
+                for line in idx:
+                    try:
+                        key, offset, length = json.loads(line)
+                    except ValueError:
+                        stale = True
+                        break
+                    if offset + length > size:
+                        stale = True
+                        break
+                    self.offsets[key] = (offset, length)
+                    end = max(end, offset + length)
+        if stale or end < size:
+            self._scan(end, sidecar)
+
+    def _scan(self, start: int, sidecar: Path) -> None:
+        """Index records from start onwards and rewrite the sidecar"""
+        self.f.seek(start)
+        offset = start
+        for line in self.f:
+            if not line.endswith(b"\n"):
+                break
+            self.size = offset + len(line)
+            key = json.loads(line)[0]
+            self.offsets[key] = (offset, len(line))
+            offset += len(line)
+        ordered = sorted(self.offsets.items(), key=lambda item: item[1][0])
+        tmp = sidecar.with_name(sidecar.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as idx:
+            for key, (offset, length) in ordered:
+                idx.write(json.dumps([key, offset, length], ensure_ascii=False) + "\n")
+        tmp.replace(sidecar)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.f.close()
+
+    def __getitem__(self, key) -> Any:
+        offset, length = self.offsets[str(key)]
+        self.f.seek(offset)
+        return json.loads(self.f.read(length))[1]
+
+    def __contains__(self, key) -> bool:
+        return str(key) in self.offsets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Stream the latest version of every record in file order.
+
+        Records appended after the file was opened are not included, so a
+        caller may append updates to the same file while iterating.
+        """
+        latest = {offset for offset, _ in self.offsets.values()}
+        self.f.seek(0)
+        offset = 0
+        for line in self.f:
+            if offset >= self.size:
+                break
+            if offset in latest:
+                yield tuple(json.loads(line))
+            offset += len(line)
+
+def _sort_key(key: str):
+    return (0, int(key), "") if key.isdigit() else (1, 0, key)
+
+def compact(path: Path) -> Tuple[int, int]:
+    """Rewrite a record file with only the latest version of each key, in key order"""
+    before = path.stat().st_size
+    tmp = path.with_name(path.name + ".compact")
+    for leftover in (tmp, index_path(tmp)):
+        if leftover.exists():
+            leftover.unlink()
+    with RecordFile(path) as records:
+        with RecordWriter(tmp) as writer:
+            for key in sorted(records, key=_sort_key):
+                writer.write(key, records[key])
+    tmp.replace(path)
+    index_path(tmp).replace(index_path(path))
+    return before, path.stat().st_size
+
+def convert_json(source: Path, path: Path) -> int:
+    """Append the entries of a legacy JSON object file to a record file"""
+    with RecordWriter(path) as writer:
+        for key, value in iter_json_object(source):
+            writer.write(key, value)
+        return writer.count
+
+@click.command(help="Compact an NDJSON record file, or convert a legacy JSON record file")
+@click.option(
+    '-r',
+    '--record_file',
+    required=True,
+    type=Path,
+    help='NDJSON record file, e.g. uris.ndjson or minted-carscan.ndjson'
+)
+@click.option(
+    '-j',
+    '--from_json',
+    type=Path,
+    help='Legacy JSON object file to convert into record_file first'
+)
+@click.option(
+    '-l',
+    '--log_file',
+    default="minter.log",
+    type=click.STRING,
+    help='Logfile to record runtime info'
+)
+def compact_records(record_file, from_json, log_file) -> None:
+    logger = get_logger(__name__, log_file)
+    if from_json:
+        converted = convert_json(from_json, record_file)
+        logger.info(f"CONVERTED {converted} records {from_json} => {record_file}")
+    before, after = compact(record_file)
+    logger.info(f"COMPACTED {record_file} {before} => {after} bytes")
@@ -0,0 +1,196 @@
+import time
+import random
+import asyncio
+import threading
+import requests
+import httpx
+from botocore.exceptions import BotoCoreError, ClientError
+from typing import Any, Awaitable, Callable, Dict
+
+# exception class names retried wherever they appear in the MRO, so we do
+# not need to import every client library that raises them
+RETRYABLE_NAMES = {"ConnectionClosed", "InvalidStatusCode"}
+# rippled errors that mean the server is overloaded or not synced yet;
+# txnNotFound, actMalformed, invalidParams and the like are permanent
+RETRYABLE_XRPL_ERRORS = {"tooBusy", "noNetwork", "noCurrent", "noClosed", "slowDown"}
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+RETRYABLE_S3_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "SlowDown",
+    "RequestTimeout",
+    "RequestTimeTooSkewed",
+    "InternalError",
+    "ServiceUnavailable",
+}
+
+class TransientError(Exception):
+    """ A failed call worth retrying whose client swallowed the cause,
+    e.g. a pin request that came back without a hash """
+
+class RetryBudget:
+    """ Process-wide cap on retries, so an outage fails fast instead of
+    every call site sleeping through its full backoff schedule """
+
+    def __init__(self, max_retries: int) -> None:
+        self.remaining = max_retries
+        self.lock = threading.Lock()
+
+    def spend(self) -> bool:
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+class RetryPolicy:
+    """ Attempts and capped exponential backoff with full jitter """
+
+    def __init__(
+        self,
+        attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        budget: RetryBudget = None,
+    ) -> None:
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget(1000)
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+DEFAULT_POLICY = RetryPolicy()
+RETRY_STATS = {}
+STATS_LOCK = threading.Lock()
+
+def configure_retry(config: Dict) -> RetryPolicy:
+    """Set the default policy from retry_attempts/retry_base_delay/retry_budget"""
+    global DEFAULT_POLICY
+    DEFAULT_POLICY = RetryPolicy(
+        attempts=config.get("retry_attempts", 4),
+        base_delay=config.get("retry_base_delay", 0.5),
+        max_delay=config.get("retry_max_delay", 30.0),
+        budget=RetryBudget(config.get("retry_budget", 1000)),
+    )
+    return DEFAULT_POLICY
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transient network, throttling and 5xx errors retry; everything else is fatal"""
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return exc.response.status_code in RETRYABLE_STATUS
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS
+    if isinstance(exc, ClientError):
+        error = exc.response.get("Error", {})
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return error.get("Code") in RETRYABLE_S3_CODES or status in RETRYABLE_STATUS
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if "XRPLRequestFailureException" in names:
+        return getattr(exc, "error", None) in RETRYABLE_XRPL_ERRORS
+    if isinstance(exc, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        httpx.TransportError,
+        BotoCoreError,
+        asyncio.TimeoutError,
+        TransientError,
+        ConnectionError,
+        TimeoutError,
+    )):
+        return True
+    return bool(names & RETRYABLE_NAMES)
+
+def _count(name: str, field: str) -> None:
+    with STATS_LOCK:
+        stats = RETRY_STATS.setdefault(name, {"calls": 0, "retries": 0, "failures": 0})
+        stats[field] += 1
+
+def _should_retry(name: str, attempt: int, policy: RetryPolicy, error, logger) -> bool:
+    if attempt + 1 >= policy.attempts or not policy.budget.spend():
+        _count(name, "failures")
+        return False
+    _count(name, "retries")
+    if logger:
+        logger.warning(f"RETRY {name} attempt {attempt + 1}: {error}")
+    return True
+
+def retry_call(
+    name: str,
+    fn: Callable,
+    *args,
+    policy: RetryPolicy = None,
+    retry_if: Callable[[Any], bool] = None,
+    logger=None,
+    **kwargs,
+) -> Any:
+    """Call fn, retrying retryable exceptions and results for which retry_if is true.
+
+    The last result is returned, or the last exception raised, once the
+    attempts or the global budget run out. Successful calls never sleep.
+    """
+    policy = policy or DEFAULT_POLICY
+    _count(name, "calls")
+    attempt = 0
+    while True:
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                _count(name, "failures")
+                raise
+            if not _should_retry(name, attempt, policy, e, logger):
+                raise
+        else:
+            if not retry_if or not retry_if(result):
+                return result
+            if not _should_retry(name, attempt, policy, result, logger):
+                return result
+        time.sleep(policy.delay(attempt))
+        attempt += 1
+
+async def retry_async(
+    name: str,
+    fn: Callable,
+    *args,
+    policy: RetryPolicy = None,
+    retry_if: Callable[[Any], bool] = None,
+    logger=None,
+    on_retry: Callable[[], Awaitable] = None,
+    **kwargs,
+) -> Any:
+    """asyncio counterpart of retry_call for coroutine functions
+
+    on_retry is awaited before every attempt after the first, e.g. to
+    reconnect a client; if it fails, that attempt fails with it.
+    """
+    policy = policy or DEFAULT_POLICY
+    _count(name, "calls")
+    attempt = 0
+    while True:
+        try:
+            if attempt and on_retry:
+                await on_retry()
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                _count(name, "failures")
+                raise
+            if not _should_retry(name, attempt, policy, e, logger):
+                raise
+        else:
+            if not retry_if or not retry_if(result):
+                return result
+            if not _should_retry(name, attempt, policy, result, logger):
+                return result
+        await asyncio.sleep(policy.delay(attempt))
+        attempt += 1
+
+def log_retry_stats(logger) -> None:
+    with STATS_LOCK:
+        for name, stats in sorted(RETRY_STATS.items()):
+            logger.info(
+                f"RETRY STATS {name}: calls={stats['calls']} "
+                f"retries={stats['retries']} failures={stats['failures']}"
+            )
@@ -0,0 +1,273 @@
+import psycopg2
+import click
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+from utils import load_config, get_logger, configure_logging
+from records import RecordFile
+from db import DEFAULT_CHUNK_SIZE, copy_chunk, copy_entries
+from tracing import span, configure_tracing, finish_tracing
+
+DEFAULT_PREFIX = "nft"
+# record keys that describe the token rather than one of its traits
+NON_TRAIT_KEYS = {
+    "id",
+    "tokenID",
+    "uri",
+    "name",
+    "description",
+    "image",
+    "external_url",
+    "animation_url",
+    "edition",
+    "dna",
+    "date",
+    "compiler",
+    "attributes",
+    "rarity_score",
+    "statistical_rarity",
+    "rarity_rank",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {prefix}_tokens (
+    token_id TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    name TEXT,
+    uri TEXT
+);
+ALTER TABLE {prefix}_tokens ADD COLUMN IF NOT EXISTS rarity_score DOUBLE PRECISION;
+ALTER TABLE {prefix}_tokens ADD COLUMN IF NOT EXISTS rarity_rank INTEGER;
+CREATE INDEX IF NOT EXISTS {prefix}_tokens_collection ON {prefix}_tokens (collection, idx);
+CREATE INDEX IF NOT EXISTS {prefix}_tokens_rank ON {prefix}_tokens (collection, rarity_rank);
+CREATE TABLE IF NOT EXISTS {prefix}_traits (
+    trait_id SERIAL PRIMARY KEY,
+    collection TEXT NOT NULL,
+    trait_type TEXT NOT NULL,
+    value TEXT NOT NULL,
+    token_count INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (collection, trait_type, value)
+);
+CREATE TABLE IF NOT EXISTS {prefix}_token_traits (
+    trait_id INTEGER NOT NULL REFERENCES {prefix}_traits ON DELETE CASCADE,
+    token_id TEXT NOT NULL REFERENCES {prefix}_tokens ON DELETE CASCADE,
+    PRIMARY KEY (trait_id, token_id)
+);
+CREATE INDEX IF NOT EXISTS {prefix}_token_traits_token ON {prefix}_token_traits (token_id, trait_id);
+CREATE TEMP TABLE IF NOT EXISTS {prefix}_tokens_staging
+    (LIKE {prefix}_tokens INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+"""
+
+def extract_traits(record: Dict) -> Dict[str, str]:
+    """trait_type -> value from an "attributes" list, else from top-level scalar keys"""
+    attributes = record.get("attributes")
+    if isinstance(attributes, list):
+        return {
+            str(attribute["trait_type"]): str(attribute["value"])
+            for attribute in attributes
+            if isinstance(attribute, dict)
+            and "trait_type" in attribute
+            and attribute.get("value") is not None
+        }
+    return {
+        key: str(value)
+        for key, value in record.items()
+        if key not in NON_TRAIT_KEYS
+        and value is not None
+        and isinstance(value, (str, int, float, bool))
+    }
+
+def iter_tokens(minted_nft_record_file: Path, start: int, end: int) -> Iterator[Tuple[Tuple, Dict[str, str]]]:
+    """(token row, traits) for every minted record in the index range"""
+    with RecordFile(minted_nft_record_file) as records:
+        for num, record in records.items():
+            if start <= int(num) <= end:
+                token = (
+                    record["tokenID"],
+                    int(num),
+                    record.get("name"),
+                    record.get("uri"),
+                    record.get("rarity_score"),
+                    record.get("rarity_rank"),
+                )
+                yield token, extract_traits(record)
+
+class TraitLoader:
+    """ Loads tokens and their traits into the normalized schema
+
+    Trait ids are cached across chunks, so each distinct trait_type/value
+    pair costs one round trip per run.
+    """
+
+    def __init__(self, conn, prefix: str, collection: str) -> None:
+        self.conn = conn
+        self.prefix = prefix
+        self.collection = collection
+        self.trait_ids = {}
+
+    def create_schema(self) -> None:
+        cursor = self.conn.cursor()
+        cursor.execute(SCHEMA.format(prefix=self.prefix))
+        self.conn.commit()
+
+    def _trait_ids(self, cursor, traits: List[Tuple[str, str]]) -> None:
+        missing = sorted(set(trait for trait in traits if trait not in self.trait_ids))
+        if not missing:
+            return None
+        cursor.executemany(
+            f"INSERT INTO {self.prefix}_traits (collection, trait_type, value) "
+            f"VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
+            [(self.collection, trait_type, value) for trait_type, value in missing],
+        )
+        cursor.execute(
+            f"SELECT trait_type, value, trait_id FROM {self.prefix}_traits WHERE collection = %s",
+            (self.collection,),
+        )
+        for trait_type, value, trait_id in cursor.fetchall():
+            self.trait_ids[(trait_type, value)] = trait_id
+
+    def load_chunk(self, cursor, table: str, chunk: List[Tuple[Tuple, Dict[str, str]]]) -> None:
+        """Upsert the chunk's tokens and replace their trait links"""
+        prefix = self.prefix
+        columns = ("token_id", "collection", "idx", "name", "uri", "rarity_score", "rarity_rank")
+        copy_chunk(
+            cursor,
+            f"{prefix}_tokens_staging",
+            [(token[0], self.collection) + token[1:] for token, _ in chunk],
+            columns,
+        )
+        names = ", ".join(columns)
+        cursor.execute(
+            f"INSERT INTO {prefix}_tokens ({names}) SELECT {names} FROM {prefix}_tokens_staging "
+            f"ON CONFLICT (token_id) DO UPDATE SET collection = EXCLUDED.collection, "
+            f"idx = EXCLUDED.idx, name = EXCLUDED.name, uri = EXCLUDED.uri, "
+            f"rarity_score = EXCLUDED.rarity_score, rarity_rank = EXCLUDED.rarity_rank"
+        )
+        cursor.execute(
+            f"DELETE FROM {prefix}_token_traits WHERE token_id IN "
+            f"(SELECT token_id FROM {prefix}_tokens_staging)"
+        )
+        self._trait_ids(cursor, [trait for _, traits in chunk for trait in traits.items()])
+        copy_chunk(
+            cursor,
+            f"{prefix}_token_traits",
+            [
+                (self.trait_ids[trait], token[0])
+                for token, traits in chunk
+                for trait in traits.items()
+            ],
+            ("trait_id", "token_id"),
+        )
+
+    def update_counts(self) -> int:
+        """Precompute how many tokens of the collection carry each trait"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"UPDATE {self.prefix}_traits AS t SET token_count = "
+            f"(SELECT count(*) FROM {self.prefix}_token_traits AS tt WHERE tt.trait_id = t.trait_id) "
+            f"WHERE t.collection = %s",
+            (self.collection,),
+        )
+        updated = cursor.rowcount
+        self.conn.commit()
+        return updated
+
+@click.command(help="Upload minted NFT traits to a normalized Postgres schema")
+@click.option(
+    '-c',
+    '--config_file',
+    required=True,
+    type=Path,
+    help='Config file with secrets and details about collection to mint'
+)
+@click.option(
+    '-l',
+    '--log_file',
+    default="minter.log",
+    type=click.STRING,
+    help='Logfile to record runtime info'
+)
+@click.option(
+    '-m',
+    '--minted_nft_record_file',
+    required=True,
+    type=Path,
+    help='File containing minted nft records'
+)
+@click.option(
+    '-p',
+    '--prefix',
+    default=DEFAULT_PREFIX,
+    type=click.STRING,
+    help='Prefix of the tokens, traits and token_traits tables'
+)
+@click.option(
+    '-s',
+    '--start',
+    type=click.INT,
+    help='Start index of file in collection to upload'
+)
+@click.option(
+    '-e',
+    '--end',
+    type=click.INT,
+    help='End index of file in collection to upload'
+)
+@click.option(
+    '--chunk_size',
+    default=DEFAULT_CHUNK_SIZE,
+    type=click.INT,
+    help='Tokens per chunk, each chunk is committed on its own'
+)
+@click.option(
+    '--trace_file',
+    type=Path,
+    help='Write per-chunk spans here as a Chrome trace and log a latency report'
+)
+@click.option(
+    '-d',
+    '--dry_run',
+    is_flag=True,
+)
+def upload_traits(config_file, log_file, minted_nft_record_file, prefix, start, end, chunk_size, trace_file, dry_run) -> None:
+    logger = get_logger(__name__, log_file)
+    config = load_config(config_file)
+    configure_logging(config)
+    configure_tracing(trace_file)
+    db_url = config["heroku_db_url"]
+    collection = config["collection"]
+    if not start:
+        start = config["start_idx"]
+    if not end:
+        end = config["end_idx"]
+    if dry_run:
+        trait_types = {}
+        for _, traits in iter_tokens(minted_nft_record_file, start, end):
+            for trait_type in traits:
+                trait_types[trait_type] = trait_types.get(trait_type, 0) + 1
+        logger.info(f"Would process {start} to {end} with traits {trait_types}")
+        return None
+    conn = None
+    try:
+        logger.info("CONNECTING TO DB")
+        conn = psycopg2.connect(db_url)
+        loader = TraitLoader(conn, prefix, collection)
+        loader.create_schema()
+        logger.info(f"TRAITS {minted_nft_record_file} => {prefix}_tokens/_traits/_token_traits")
+        copy_entries(
+            conn,
+            prefix,
+            iter_tokens(minted_nft_record_file, start, end),
+            chunk_size,
+            logger,
+            load=loader.load_chunk,
+        )
+        with span("db.trait_counts", collection=collection):
+            counted = loader.update_counts()
+        logger.info(f"COUNTED {counted} traits for {collection}")
+    except Exception as e:
+        logger.error(f"EXCEPTION ENCOUNTERED: {e}")
+    finally:
+        if conn:
+            conn.close()
+        finish_tracing(logger, trace_file)
@@ -0,0 +1,63 @@
+import asyncio
+import click
+from context import (
+    XRPLAccount,
+    get_network_url,
+)
+from pathlib import Path
+from utils import load_config, get_logger, configure_logging
+
+@click.command(help="Export account transaction history to an NDJSON file")
+@click.option(
+    '-c',
+    '--config_file',
+    required=True,
+    type=Path,
+    help='Config file with secrets and details about collection to mint'
+)
+@click.option(
+    '-l',
+    '--log_file',
+    default="minter.log",
+    type=click.STRING,
+    help='Logfile to record runtime info'
+)
+@click.option(
+    '-o',
+    '--output_file',
+    default="txs.ndjson",
+    type=Path,
+    help='NDJSON file to append transaction rows to'
+)
+@click.option(
+    '--ledger_min',
+    type=click.INT,
+    help='Earliest ledger index to export'
+)
+@click.option(
+    '--ledger_max',
+    type=click.INT,
+    help='Latest ledger index to export'
+)
+@click.option(
+    '--page_size',
+    default=200,
+    type=click.INT,
+    help='Transactions requested per account_tx page'
+)
+def export_txs(config_file, log_file, output_file, ledger_min, ledger_max, page_size) -> None:
+    logger = get_logger(__name__, log_file)
+    config = load_config(config_file)
+    configure_logging(config)
+    network_url = get_network_url(mode="devnet")
+    acc = XRPLAccount(config["xrpl_secret"], network_url)
+    logger.info(f"EXPORT {acc.address} => {output_file}")
+    written = asyncio.run(
+        acc.export_txs(
+            output_file,
+            ledger_index_min=ledger_min,
+            ledger_index_max=ledger_max,
+            limit=page_size,
+        )
+    )
+    logger.info(f"EXPORTED {written} transactions")